@@ -0,0 +1,295 @@
+# bot/benchmarks/fakes.py
+"""
+Локальные заглушки внешних сервисов для бенчмарков:
+- FakeGateway  — gateway.e-disclosure.ru (авторизация, события, файлы);
+- FakeS3       — минимальный S3-эндпоинт для клиента MinIO;
+- FakeTelegram — Bot API сервер для aiogram.
+Каждый сервер работает в отдельном потоке со своим event loop (клиент MinIO синхронный
+и блокирует loop бота), слушает случайный порт и считает запросы.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+try:
+    import py7zr
+    _has_7z = True
+except ImportError:
+    _has_7z = False
+
+
+def make_pdf(size: int) -> bytes:
+    header = b"%PDF-1.4\n"
+    trailer = b"\n%%EOF\n"
+    return header + b"0" * max(size - len(header) - len(trailer), 0) + trailer
+
+
+def make_zip(size: int, members: int = 3) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        for i in range(members):
+            zf.writestr(f"report_{i}.pdf", make_pdf(size // members))
+    return buf.getvalue()
+
+
+def make_7z(size: int, members: int = 3) -> bytes:
+    if not _has_7z:
+        raise RuntimeError("py7zr не установлен")
+    buf = io.BytesIO()
+    with py7zr.SevenZipFile(buf, "w") as archive:
+        for i in range(members):
+            archive.writef(io.BytesIO(make_pdf(size // members)), f"report_{i}.pdf")
+    return buf.getvalue()
+
+
+def make_html(size: int) -> bytes:
+    """Страница ошибки вместо файла — такой ответ должен прерываться по первому килобайту."""
+    page = b"<!DOCTYPE html>\n<html><head><title>Access denied</title></head><body>"
+    return page + b"<p>try later</p>" * max((size - len(page)) // 16, 0) + b"</body></html>"
+
+
+PAYLOAD_BUILDERS = {"pdf": make_pdf, "zip": make_zip, "7z": make_7z, "html": make_html}
+
+
+class _FakeServer:
+    def __init__(self):
+        self.app = web.Application(client_max_size=1024 ** 3)
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self._runner = None
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, args=(started,), daemon=True)
+        self._thread.start()
+        await asyncio.to_thread(started.wait)
+        return self
+
+    def _serve(self, started: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    async def stop(self):
+        if self._runner:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            await asyncio.to_thread(self._thread.join)
+
+
+class FakeGateway(_FakeServer):
+    def __init__(self, events_per_inn: int = 2, payload: str = "pdf", payload_size: int = 200_000):
+        super().__init__()
+        self.events_per_inn = events_per_inn
+        self.fail_status = None  # например 503 — имитация недоступности шлюза
+        self.events_by_token = Counter()  # запросы событий по токену — распределение по аккаунтам
+        self.payload = PAYLOAD_BUILDERS[payload](payload_size)
+        self.app.router.add_post("/api/v1/auth", self._auth)
+        self.app.router.add_get("/api/v1/disclosure/events", self._events)
+        self.app.router.add_get("/files/{uid}", self._file)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/api/v1"
+
+    async def _auth(self, request: web.Request):
+        self.requests["auth"] += 1
+        login = (await request.json()).get("login", "")
+        expiration = (datetime.utcnow() + timedelta(days=1)).isoformat()
+        return web.json_response({"token": f"bench-token-{login}", "expirationDate": expiration})
+
+    def make_event(self, inn: str, idx: int) -> dict:
+        uid = f"{inn}-{idx:04d}"
+        today = datetime.utcnow()
+        return {
+            "uid": uid,
+            "publishDate": today.replace(microsecond=0).isoformat() + "Z",
+            "subject": {"shortName": f"ПАО Компания {inn}", "fullName": f"ПАО Компания {inn}",
+                        "inn": inn, "ogrn": f"1{inn}00"},
+            "file": {
+                "uid": uid,
+                "publicUrl": f"{self.url}/files/{uid}",
+                "description": "Синтетический отчёт",
+                "type": {"name": "Годовая отчетность"},
+                "category": {"name": "Годовая бухгалтерская отчетность"},
+                "attributes": [
+                    {"name": "DatePub", "value": today.strftime("%d.%m.%Y")},
+                    {"name": "YearRep", "value": str(today.year)},
+                ],
+            },
+        }
+
+    async def _events(self, request: web.Request):
+        self.requests["events"] += 1
+        self.events_by_token[request.headers.get("APIKey", "")] += 1
+        if self.fail_status:
+            return web.Response(status=self.fail_status)
+        inn = request.query.get("subjectCode", "0000000000")
+        count = int(request.query.get("count", "100"))
+        skip = int(request.query.get("skip", "0"))
+        events = [self.make_event(inn, i) for i in range(skip, min(self.events_per_inn, skip + count))]
+        body = json.dumps(events, ensure_ascii=False).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.requests["events_not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        self.bytes_sent += len(body)
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    async def _file(self, request: web.Request):
+        self.requests["files"] += 1
+        self.bytes_sent += len(self.payload)
+        content_type = "text/html" if self.payload.startswith(b"<!DOCTYPE") else "application/octet-stream"
+        return web.Response(body=self.payload, content_type=content_type)
+
+
+class FakeS3(_FakeServer):
+    """Хранит объекты в памяти. Подписи запросов не проверяются."""
+
+    def __init__(self):
+        super().__init__()
+        self.buckets: dict[str, dict[str, bytes]] = {}
+        self.app.router.add_route("*", "/{bucket}", self._bucket)
+        self.app.router.add_route("*", "/{bucket}/{key:.+}", self._object)
+
+    @property
+    def endpoint(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    async def _bucket(self, request: web.Request):
+        bucket = request.match_info["bucket"]
+        self.requests[f"bucket_{request.method.lower()}"] += 1
+        if "location" in request.query:
+            return web.Response(
+                text='<?xml version="1.0" encoding="UTF-8"?>'
+                     '<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/">us-east-1</LocationConstraint>',
+                content_type="application/xml",
+            )
+        if request.method == "HEAD":
+            return web.Response(status=200 if bucket in self.buckets else 404)
+        if request.method == "PUT":
+            self.buckets.setdefault(bucket, {})
+            return web.Response(status=200)
+        return web.Response(status=405)
+
+    async def _object(self, request: web.Request):
+        bucket = self.buckets.setdefault(request.match_info["bucket"], {})
+        key = request.match_info["key"]
+        self.requests[f"object_{request.method.lower()}"] += 1
+        if request.method == "PUT":
+            bucket[key] = await request.read()
+            return web.Response(status=200, headers={"ETag": f'"{len(bucket[key]):x}"'})
+        if key not in bucket:
+            return web.Response(status=404)
+        data = bucket[key]
+        headers = {"ETag": f'"{len(data):x}"', "Content-Length": str(len(data)),
+                   "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        if request.method == "HEAD":
+            return web.Response(status=200, headers=headers)
+        self.bytes_sent += len(data)
+        return web.Response(body=data, headers=headers)
+
+
+class FakeTelegram(_FakeServer):
+    """
+    Отвечает на любой метод Bot API минимальным валидным Message. Для режима webhook
+    играет роль Telegram: push_update доставляет апдейт на адрес бота с секретным
+    заголовком, replied_at — когда бот впервые ответил в чат.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_received = 0
+        self._message_id = 0
+        self.replied_at: dict[int, float] = {}
+        self.app.router.add_post("/bot{token}/{method}", self._method)
+
+    @staticmethod
+    def make_message_update(update_id: int, user_id: int, text: str) -> dict:
+        user = {"id": user_id, "is_bot": False, "first_name": f"user {user_id}"}
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": user,
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                if text.startswith("/") else [],
+            },
+        }
+
+    @staticmethod
+    def make_callback_update(update_id: int, user_id: int, data: str) -> dict:
+        """Нажатие inline-кнопки под сообщением бота."""
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user {user_id}"},
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "📅 Выберите год публикации:",
+                },
+            },
+        }
+
+    @staticmethod
+    async def push_update(session, webhook_url: str, update: dict, secret: str = None) -> int:
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        async with session.post(webhook_url, json=update, headers=headers) as response:
+            await response.read()
+            return response.status
+
+    async def _method(self, request: web.Request):
+        method = request.match_info["method"]
+        self.requests[method] += 1
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            fields = {k: v for k, v in form.items() if isinstance(v, str)}
+            self.bytes_received += sum(
+                len(v.file.read()) for v in form.values() if isinstance(v, web.FileField)
+            )
+        else:
+            fields = dict(await request.post())
+        self._message_id += 1
+        chat_id = int(fields.get("chat_id", 0) or 0)
+        if method == "sendMessage":
+            self.replied_at.setdefault(chat_id, time.perf_counter())
+        result = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method in ("deleteWebhook", "deleteMessage", "answerCallbackQuery"):
+            result = True
+        elif method == "sendMediaGroup":
+            media = json.loads(fields.get("media", "[]"))
+            result = [dict(result, message_id=self._message_id + i) for i in range(len(media))]
+            self._message_id += len(media)
+        return web.json_response({"ok": True, "result": result})
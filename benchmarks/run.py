@@ -0,0 +1,402 @@
+# bot/benchmarks/run.py
+"""
+Сквозной бенчмарк горячих путей на локальных заглушках Интерфакса, MinIO и Telegram.
+
+    python -m benchmarks.run --inns 1000 --subscriptions 10000 --payload zip --payload-size 2000000
+
+Сценарии: dispatch (process_events; с --digest — очередь дайджестов и её отправка),
+search (search_reports_by_category), download (download_and_extract_file),
+archive (повторная выдача из MinIO после dispatch), webhook (апдейты от заглушки Telegram
+во встроенный сервер webhook), issuers (подсказки по названию и ИНН из справочника эмитентов). Для каждого печатаются пропускная способность,
+p50/p99 латентности, пиковый RSS и число запросов к заглушкам.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# окружение должно быть готово до импорта модулей бота
+_workdir = tempfile.mkdtemp(prefix="finbot_bench_")
+os.environ["BOT_DB_PATH"] = str(Path(_workdir) / "bench.db")
+os.environ["INTERFAX_TOKEN_FILE"] = str(Path(_workdir) / "token.json")
+os.environ.setdefault("FILE_CACHE_DIR", str(Path(_workdir) / "file_cache"))
+os.environ.setdefault("MINIO_ACCESS_KEY", "bench")
+os.environ.setdefault("MINIO_SECRET_KEY", "benchbench")
+
+from benchmarks.fakes import FakeGateway, FakeS3, FakeTelegram  # noqa: E402
+
+
+class Timed:
+    """Прокси над клиентом: замеряет длительность каждого вызова асинхронных методов."""
+
+    def __init__(self, target):
+        self._target = target
+        self.latencies = defaultdict(list)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                self.latencies[name].append(time.perf_counter() - started)
+
+        return wrapper
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss на Linux в килобайтах, на macOS в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def report(name: str, elapsed: float, ops: int, latencies: list[float], servers: dict):
+    print(f"\n=== {name} ===")
+    print(f"время: {elapsed:.2f} c, операций: {ops}, пропускная способность: {ops / elapsed if elapsed else 0:.1f} оп/с")
+    print(f"латентность p50: {percentile(latencies, 50) * 1000:.1f} мс, p99: {percentile(latencies, 99) * 1000:.1f} мс")
+    print(f"пиковый RSS: {peak_rss_mb():.1f} МБ")
+    for server_name, server in servers.items():
+        print(f"{server_name}: {dict(server.requests)}")
+
+
+def seed_subscriptions(inns: list[str], subscriptions: int, users: int):
+    from db import get_db, init_db
+
+    init_db()
+    per_user = max(subscriptions // users, 1)
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, full_name, is_subscribed) VALUES (?, ?, 1)",
+            [(user_id, f"user {user_id}") for user_id in range(1, users + 1)],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_companies (user_id, inn, company_name) VALUES (?, ?, ?)",
+            [
+                (user_id, inns[(user_id * per_user + i) % len(inns)], f"ПАО Компания {inns[(user_id * per_user + i) % len(inns)]}")
+                for user_id in range(1, users + 1)
+                for i in range(per_user)
+            ],
+        )
+
+
+async def bench_dispatch(args, client, bot, servers):
+    from services.dispatcher import process_events
+
+    servers["gateway"].fail_status = 503 if args.outage else None
+    timed = Timed(client)
+    started = time.perf_counter()
+    await process_events(bot, timed)
+    if args.digest:
+        from services.digest import digest
+        await digest.flush_due(bot, window_seconds=0)
+    elapsed = time.perf_counter() - started
+    ops = servers["telegram"].requests["sendDocument"] + servers["telegram"].requests["sendMediaGroup"]
+    report("dispatch: process_events", elapsed, ops, timed.latencies["get_file_events"], servers)
+
+
+async def bench_search(args, client, inns, servers):
+    servers["gateway"].events_by_token.clear()
+    timed = Timed(client)
+    year = time.gmtime().tm_year
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(inn):
+        async with sem:
+            return await timed.search_reports_by_category(inn, "бухгалтерская", year)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(inn) for inn in inns[:args.searches]))
+    elapsed = time.perf_counter() - started
+    report("search: search_reports_by_category", elapsed, args.searches,
+           timed.latencies["search_reports_by_category"], servers)
+    print(f"аккаунтов: {args.accounts} ({args.routing}), запросов по токенам: "
+          f"{sorted(servers['gateway'].events_by_token.values())}")
+
+
+async def bench_download(args, client, gateway, servers):
+    from utils.workspace import Workspace
+
+    timed = Timed(client)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with sem:
+            file_data = gateway.make_event(f"{9000000000 + i}", i)["file"]
+            with Workspace("bench") as workspace:
+                await timed.download_and_extract_file(file_data, workspace)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.downloads)))
+    elapsed = time.perf_counter() - started
+    report("download: download_and_extract_file", elapsed, args.downloads,
+           timed.latencies["download_and_extract_file"], servers)
+
+
+async def bench_archive(args, client, gateway, inns, servers):
+    """Повторная выдача уже разосланных отчётов: из MinIO вместо шлюза (после dispatch)."""
+    from services.report_store import get_report_files_for_event
+    from utils.workspace import Workspace
+
+    timed = Timed(client)
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(inn):
+        event = gateway.make_event(inn, 0)
+        async with sem:
+            started = time.perf_counter()
+            with Workspace("bench") as workspace:
+                await get_report_files_for_event(timed, event["uid"], event["file"], workspace)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(inn) for inn in inns[:args.searches]))
+    elapsed = time.perf_counter() - started
+    report("archive: get_report_files_for_event", elapsed, len(latencies), latencies, servers)
+
+
+async def bench_webhook(args, bot, servers):
+    """Режим webhook: от доставки апдейта заглушкой Telegram до ответа хэндлера /start."""
+    import aiohttp
+    from aiohttp import web
+    from aiogram import Dispatcher
+
+    from config import WebhookConfig
+    from handlers import start
+    from services.webhook import build_webhook_app
+
+    telegram = servers["telegram"]
+    config = WebhookConfig(url="", path="/telegram/webhook", host="127.0.0.1", port=0,
+                           secret="bench-secret", max_connections=40)
+    dp = Dispatcher()
+    dp.include_router(start.router)
+    runner = web.AppRunner(build_webhook_app(dp, bot, config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{config.path}"
+
+    sem = asyncio.Semaphore(args.concurrency)
+    acks, latencies = [], []
+    users = range(10_000_000, 10_000_000 + args.updates)
+    try:
+        async with aiohttp.ClientSession() as session:
+            rejected = await telegram.push_update(session, url, telegram.make_message_update(0, 1, "/start"), "wrong")
+
+            async def one(user_id):
+                async with sem:
+                    started = time.perf_counter()
+                    await telegram.push_update(session, url, telegram.make_message_update(user_id, user_id, "/start"),
+                                               config.secret)
+                    acks.append(time.perf_counter() - started)
+                    while user_id not in telegram.replied_at:
+                        await asyncio.sleep(0.001)
+                    latencies.append(telegram.replied_at[user_id] - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(user_id) for user_id in users))
+            elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    report("webhook: update → ответ хэндлера", elapsed, len(latencies), latencies, servers)
+    print(f"подтверждение апдейта p50: {percentile(acks, 50) * 1000:.1f} мс, p99: {percentile(acks, 99) * 1000:.1f} мс; "
+          f"неверный секрет → HTTP {rejected}")
+
+
+async def bench_jobs(args, client, bot, inns, servers):
+    """Поиск из хэндлера: подтверждение нажатия кнопки и полное выполнение фоновой задачи."""
+    from aiogram import Dispatcher
+    from aiogram.types import Update
+
+    from handlers import search
+    from services.jobs import jobs
+
+    search.interfax_client = client
+    telegram = servers["telegram"]
+    year = time.gmtime().tm_year
+    dp = Dispatcher()
+    dp.include_router(search.router)
+
+    users = [(20_000_000 + i, inn) for i, inn in enumerate(inns[:args.searches])]
+    for user_id, inn in users:
+        state = dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+        await state.set_state(search.SearchStates.choosing_year)
+        await state.set_data({"subject_code": inn, "category": "бухгалтерская"})
+
+    acks, latencies = [], []
+
+    async def one(update_id, user_id):
+        started = time.perf_counter()
+        update = Update.model_validate(telegram.make_callback_update(update_id, user_id, f"year_{year}"),
+                                       context={"bot": bot})
+        await dp.feed_update(bot, update)
+        acks.append(time.perf_counter() - started)
+        while jobs.user_jobs(user_id):
+            await asyncio.sleep(0.005)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, user_id) for i, (user_id, _) in enumerate(users, start=1)))
+    elapsed = time.perf_counter() - started
+    await jobs.stop()
+
+    report("jobs: нажатие «год» → документы отправлены", elapsed, len(latencies), latencies, servers)
+    print(f"ответ хэндлера (answerCallbackQuery) p50: {percentile(acks, 50) * 1000:.1f} мс, "
+          f"p99: {percentile(acks, 99) * 1000:.1f} мс; воркеров: {jobs.config.workers}")
+
+
+async def bench_issuers(args, gateway, servers):
+    """Справочник эмитентов: наполнение из subject событий, загрузка из базы и поиск без шлюза."""
+    import random
+
+    from services.issuers import IssuerDirectory, issuers
+
+    rng = random.Random(42)
+    roots = ["газ", "нефть", "энерго", "сталь", "транс", "хим", "агро", "строй", "банк", "телеком",
+             "металл", "уголь", "лес", "порт", "авиа", "фарм", "ритейл", "инвест", "сеть", "маш"]
+    forms = ["ПАО", "АО", "ООО", "НАО"]
+    subjects = []
+    for i in range(args.issuers):
+        inn = str(5000000000 + i * 7919 % 4000000000)
+        subject = gateway.make_event(inn, 0)["subject"]
+        name = "".join(rng.sample(roots, 2)).capitalize()
+        subject["shortName"] = f"{rng.choice(forms)} \"{name}-{i % 97}\""
+        subject["fullName"] = f"Публичное акционерное общество \"{name}\""
+        subjects.append(subject)
+
+    started = time.perf_counter()
+    for i in range(0, len(subjects), 100):  # как приходят страницы событий
+        issuers.observe(subjects[i:i + 100])
+    observed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    IssuerDirectory().load()
+    loaded = time.perf_counter() - started
+
+    queries = []
+    for _ in range(args.lookups):
+        subject = rng.choice(subjects)
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(subject["shortName"].split()[1].strip('"')[:rng.randint(3, 8)])
+        elif kind < 0.6:
+            word = subject["shortName"].split()[1].strip('"')[:8]
+            position = rng.randrange(1, len(word) - 1)
+            queries.append(word[:position] + word[position + 1:])  # опечатка: пропущена буква
+        else:
+            queries.append(subject["inn"][:rng.randint(4, 10)])
+
+    latencies, empty = [], 0
+    started = time.perf_counter()
+    for query in queries:
+        one = time.perf_counter()
+        if not issuers.search(query, limit=8):
+            empty += 1
+        latencies.append(time.perf_counter() - one)
+    elapsed = time.perf_counter() - started
+
+    report("issuers: поиск эмитента по названию / префиксу ИНН", elapsed, len(latencies), latencies, servers)
+    print(f"поиск p50: {percentile(latencies, 50) * 1e6:.0f} мкс, p99: {percentile(latencies, 99) * 1e6:.0f} мкс; "
+          f"без результатов: {empty}")
+    print(f"эмитентов: {len(subjects)}, наполнение: {observed:.2f} с, загрузка из базы: {loaded:.2f} с")
+
+
+async def main(args):
+    gateway = await FakeGateway(args.events_per_inn, args.payload, args.payload_size).start()
+    s3 = await FakeS3().start()
+    telegram = await FakeTelegram().start()
+    os.environ["MINIO_ENDPOINT"] = s3.endpoint
+    servers = {"gateway": gateway, "s3": s3, "telegram": telegram}
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from clients.interfax import InterfaxClient
+
+    client = InterfaxClient(accounts=[(f"bench{i}", "bench") for i in range(args.accounts)], routing=args.routing)
+    client.BASE_URL = gateway.base_url
+    await client.init()
+
+    bot = Bot(
+        token="42:bench",
+        session=AiohttpSession(api=TelegramAPIServer.from_base(telegram.url)),
+        default=DefaultBotProperties(parse_mode="HTML"),
+    )
+
+    inns = [str(7700000000 + i) for i in range(args.inns)]
+    seed_subscriptions(inns, args.subscriptions, args.users)
+    print(f"📂 Рабочая директория: {_workdir}")
+    print(f"⚙️ ИНН: {args.inns}, подписок: {args.subscriptions}, пользователей: {args.users}, "
+          f"payload: {args.payload} {args.payload_size} байт")
+
+    scenarios = {
+        "dispatch": lambda: bench_dispatch(args, client, bot, servers),
+        "search": lambda: bench_search(args, client, inns, servers),
+        "download": lambda: bench_download(args, client, gateway, servers),
+        "archive": lambda: bench_archive(args, client, gateway, inns, servers),
+        "webhook": lambda: bench_webhook(args, bot, servers),
+        "jobs": lambda: bench_jobs(args, client, bot, inns, servers),
+        "issuers": lambda: bench_issuers(args, gateway, servers),
+    }
+    try:
+        for name in args.scenarios:
+            # счётчики запросов — отдельно для каждого сценария
+            for server in servers.values():
+                server.requests.clear()
+            await scenarios[name]()
+    finally:
+        await client.close()
+        await bot.session.close()
+        for server in servers.values():
+            await server.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих путей бота на локальных заглушках")
+    parser.add_argument("--inns", type=int, default=1000)
+    parser.add_argument("--subscriptions", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events-per-inn", type=int, default=1)
+    parser.add_argument("--payload", choices=["pdf", "zip", "7z", "html"], default="pdf")
+    parser.add_argument("--payload-size", type=int, default=200_000)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--downloads", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--digest", action="store_true", help="рассылка дайджестами (send_media_group)")
+    parser.add_argument("--outage", action="store_true", help="шлюз отвечает 503 на опрос событий (dispatch)")
+    parser.add_argument("--accounts", type=int, default=1, help="учётных записей Интерфакса в пуле")
+    parser.add_argument("--routing", choices=["least_loaded", "sticky"], default="least_loaded")
+    parser.add_argument("--updates", type=int, default=200, help="апдейтов в сценарии webhook")
+    parser.add_argument("--issuers", type=int, default=50_000, help="эмитентов в сценарии issuers")
+    parser.add_argument("--lookups", type=int, default=10_000, help="поисковых запросов в сценарии issuers")
+    parser.add_argument("--scenarios", nargs="+", choices=["dispatch", "search", "download", "archive", "webhook", "jobs",
+                                                         "issuers"],
+                        default=["dispatch", "search", "download", "archive", "webhook", "jobs", "issuers"])
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    if arguments.digest:
+        os.environ["DIGEST_WINDOW_MINUTES"] = "1"
+    asyncio.run(main(arguments))
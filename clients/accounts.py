@@ -0,0 +1,134 @@
+# bot/clients/accounts.py
+"""
+Пул учётных записей Интерфакса: у каждой свой токен (и файл токена), свой лимитер
+и своё состояние здоровья, поэтому пропускная способность растёт с числом аккаунтов.
+
+Маршрутизация (INTERFAX_ROUTING):
+- least_loaded — запрос уходит аккаунту с наименьшим числом выполняющихся и ждущих запросов;
+- sticky — запросы по одному ИНН всегда идут через один аккаунт (rendezvous-хеширование:
+  при выпадении аккаунта переезжают только его ИНН).
+
+Аккаунт, получивший 429, 5xx, 401 или сетевую ошибку несколько раз подряд, выводится
+из ротации на INTERFAX_ACCOUNT_COOLDOWN_SECONDS (при 429 — не меньше Retry-After).
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from utils.metrics import INTERFAX_ACCOUNT_HEALTHY, INTERFAX_ACCOUNT_IN_FLIGHT, INTERFAX_ACCOUNT_REQUESTS
+from utils.token_storage import TOKEN_FILE, is_token_expired, load_token_from_file, save_token_to_file
+
+FAILURES_TO_COOLDOWN = 3
+
+
+def token_file_for(login: str) -> Path:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in login)
+    return TOKEN_FILE.with_name(f"{TOKEN_FILE.stem}_{safe}{TOKEN_FILE.suffix}")
+
+
+class InterfaxAccount:
+    def __init__(self, login: str, password: str, token_file: Path, concurrency: int, cooldown: float):
+        self.login = login
+        self.password = password
+        self.token_file = token_file
+        self.cooldown = cooldown
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.auth_lock = asyncio.Lock()  # один вход на аккаунт, даже если токен нужен многим
+        self.token: Optional[str] = None
+        self.expires: Optional[str] = None
+        self.pending = 0  # ждут слота или выполняются
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        INTERFAX_ACCOUNT_HEALTHY.set(1, account=login)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def load_token(self):
+        token, expires = load_token_from_file(self.token_file)
+        if token:
+            self.token, self.expires = token, expires
+
+    def token_valid(self) -> bool:
+        return bool(self.token) and not is_token_expired(self.expires)
+
+    def set_token(self, token: str, expires: Optional[datetime]):
+        self.token = token
+        self.expires = expires.isoformat() if expires else None
+        save_token_to_file(token, self.expires, self.token_file)
+
+    def invalidate_token(self, token: str):
+        if self.token == token:  # параллельный запрос мог уже получить новый
+            self.token = None
+
+    def record(self, status, retry_after: Optional[float] = None):
+        """Итог запроса: HTTP-статус или "error" при сетевой ошибке."""
+        INTERFAX_ACCOUNT_REQUESTS.inc(account=self.login, status=status)
+        if status == "error" or status in (401, 403, 429) or (isinstance(status, int) and status >= 500):
+            self.failures += 1
+            if status == 429 or self.failures >= FAILURES_TO_COOLDOWN:
+                self.cool_down(retry_after)
+        else:
+            self.failures = 0
+            if self.unhealthy_until:
+                self._set_healthy()
+
+    def cool_down(self, seconds: Optional[float] = None):
+        self.unhealthy_until = time.monotonic() + max(seconds or 0, self.cooldown)
+        self.failures = 0
+        INTERFAX_ACCOUNT_HEALTHY.set(0, account=self.login)
+        logger.warning(f"🧊 Аккаунт Интерфакса {self.login} выведен из ротации на "
+                       f"{self.unhealthy_until - time.monotonic():.0f} с")
+
+    def _set_healthy(self):
+        self.unhealthy_until = 0.0
+        INTERFAX_ACCOUNT_HEALTHY.set(1, account=self.login)
+        logger.info(f"🔥 Аккаунт Интерфакса {self.login} снова в ротации")
+
+    def enter(self):
+        self.pending += 1
+        INTERFAX_ACCOUNT_IN_FLIGHT.set(self.pending, account=self.login)
+
+    def leave(self):
+        self.pending -= 1
+        INTERFAX_ACCOUNT_IN_FLIGHT.set(self.pending, account=self.login)
+
+
+class AccountPool:
+    def __init__(self, credentials: list[tuple[str, str]], routing: str = "least_loaded",
+                 concurrency: int = 5, cooldown: float = 60):
+        if not credentials:
+            raise ValueError("нужна хотя бы одна учётная запись Интерфакса")
+        if routing not in ("least_loaded", "sticky"):
+            logger.warning(f"⚠️ Неизвестный INTERFAX_ROUTING={routing} — используется least_loaded")
+            routing = "least_loaded"
+        self.routing = routing
+        single = len(credentials) == 1
+        # единственный аккаунт пишет токен в прежний файл INTERFAX_TOKEN_FILE
+        self.accounts = [
+            InterfaxAccount(login, password, TOKEN_FILE if single else token_file_for(login), concurrency, cooldown)
+            for login, password in credentials
+        ]
+        for account in self.accounts:
+            account.load_token()
+        if not single:
+            logger.info(f"👥 Аккаунтов Интерфакса: {len(self.accounts)}, маршрутизация: {routing}")
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def pick(self, route_key: Optional[str] = None) -> InterfaxAccount:
+        candidates = [account for account in self.accounts if account.healthy]
+        if not candidates:
+            # все на паузе — берём тот, что вернётся раньше
+            return min(self.accounts, key=lambda account: account.unhealthy_until)
+        if self.routing == "sticky" and route_key:
+            return max(candidates, key=lambda account: hashlib.sha256(
+                f"{account.login}:{route_key}".encode()).digest())
+        return min(candidates, key=lambda account: account.pending)
@@ -1,25 +1,67 @@
 import asyncio
 import httpx
-import os
-import tempfile
-import zipfile
-from datetime import datetime
-from typing import Optional
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Iterable, Optional
 from pydantic import BaseModel
 from loguru import logger
 
-from utils.token_storage import (
-    load_token_from_file,
-    save_token_to_file,
-    is_token_expired,
-)
+from clients.accounts import AccountPool, InterfaxAccount
 from db import has_event_been_processed
+from utils.metrics import (
+    INTERFAX_REQUESTS,
+    INTERFAX_LATENCY,
+    LIMITER_WAIT,
+    LIMITER_IN_FLIGHT,
+    DOWNLOAD_LATENCY,
+    DOWNLOAD_BYTES,
+    DOWNLOAD_RESULTS,
+    EXTRACT_LATENCY,
+)
+from utils.profiling import profiler
+from utils.tracing import StatusCode, get_tracer
+from utils.workspace import ReportFile, Workspace, WorkspaceQuotaError
+from utils.archives import extract_members, SUPPORTED_SUFFIXES
+from utils.file_cache import file_cache
+from utils.sniffing import ContentRejected, read_checked
+from utils import resilience
+from utils.resilience import CircuitOpenError
 
 try:
-    import py7zr
-    _has_7z = True
+    import h2  # noqa: F401 — нужен httpx для HTTP/2
+    _has_h2 = True
 except ImportError:
-    _has_7z = False
+    _has_h2 = False
+
+tracer = get_tracer(__name__)
+
+
+def _is_transient_error(error: BaseException) -> bool:
+    # сеть и таймауты; ошибки статуса разбираются по ответу в _is_transient_response,
+    # кроме авторизации внутри попытки — её 5xx/429 приходят как HTTPStatusError
+    if isinstance(error, httpx.HTTPStatusError):
+        return _is_transient_response(error.response)
+    return isinstance(error, httpx.TransportError)
+
+
+def _is_transient_response(response: httpx.Response) -> bool:
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def _retry_after(response) -> Optional[float]:
+    value = getattr(response, "headers", {}).get("Retry-After", "")
+    return float(value) if value.isdigit() else None
+
+
+@dataclass
+class _DownloadedFile:
+    """Проверенное тело файла; status_code и content — как у httpx.Response (для _send_limited)."""
+    status_code: int
+    content: bytes
+    suffix: str
 
 
 class TokenResponse(BaseModel):
@@ -29,55 +71,201 @@ class TokenResponse(BaseModel):
 
 class InterfaxClient:
     BASE_URL = "https://gateway.e-disclosure.ru/api/v1"
-
-    def __init__(self, login: str, password: str):
-        self._login = login
-        self._password = password
-        self._client = httpx.AsyncClient(timeout=60.0)
-        self._token: Optional[str] = None
-        self._semaphore = asyncio.Semaphore(5)  # максимум 5 запросов одновременно
+    VALIDATOR_CACHE_SIZE = 4096
+    VALIDATOR_CACHE_MAX_BYTES = 32 * 1024 * 1024  # тела ответов для 304 — не больше стольких байт в сумме
+    BAD_URL_CACHE_SIZE = 4096
+    DOWNLOAD_CONCURRENCY = 5  # одновременных скачиваний с хоста файлов, независимо от аккаунтов шлюза
+
+    def __init__(
+        self,
+        login: str = "",
+        password: str = "",
+        http2: bool = False,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        max_download_mb: int = 200,
+        bad_url_ttl_hours: float = 24,
+        accounts: Optional[list[tuple[str, str]]] = None,
+        routing: str = "least_loaded",
+        account_concurrency: int = 5,
+        account_cooldown: float = 60,
+        on_subjects: Optional[Callable[[Iterable[Optional[dict]]], None]] = None,
+    ):
+        # получает subject всех событий, которые вернул шлюз (справочник эмитентов), — задаётся снаружи
+        self.on_subjects = on_subjects
+        # без списка аккаунтов — одна учётная запись login/password
+        self.accounts = AccountPool(accounts or [(login, password)], routing, account_concurrency, account_cooldown)
+        if http2 and not _has_h2:
+            logger.warning("⚠️ HTTP/2 запрошен, но пакет h2 не установлен — используется HTTP/1.1")
+            http2 = False
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+        # файлы отдаёт другой хост (publicUrl) — отдельный пул соединений
+        self._download_client = httpx.AsyncClient(
+            timeout=timeout, limits=limits, http2=http2, follow_redirects=True,
+            headers={"User-Agent": "Mozilla/5.0"},
+        )
+        # параметры запроса → (ETag, Last-Modified, тело) для условных запросов
+        self._validators: OrderedDict[str, tuple[Optional[str], Optional[str], bytes]] = OrderedDict()
+        self._validators_bytes = 0
+        self._max_download_bytes = max_download_mb * 1024 * 1024
+        # publicUrl → (момент истечения, причина): неизвестный формат, слишком большой файл, 404/410
+        self._bad_url_ttl = bad_url_ttl_hours * 3600
+        self._bad_urls: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # хост файлов не требует токена: его слоты и ошибки не касаются аккаунтов Интерфакса
+        self._download_semaphore = asyncio.Semaphore(self.DOWNLOAD_CONCURRENCY)
 
     async def init(self):
-        self._token = await self.get_token()
+        for account in self.accounts.accounts:
+            await resilience.gateway.call(lambda: self._ensure_token(account), retryable=_is_transient_error)
 
-    async def _limited_request(self, coro):
-        async with self._semaphore:
-            await asyncio.sleep(0.2)  # 5 запросов в секунду
-            return await coro
-
-    async def _authorize(self) -> str:
-        logger.info("🔐 Авторизация в Интерфакс API...")
-        response = await self._limited_request(self._client.post(
+    async def _limited_request(self, send, endpoint: str = "api", hedge: bool = False,
+                               route_key: Optional[str] = None, account: Optional[InterfaxAccount] = None,
+                               authorized: bool = False):
+        """
+        Запрос к шлюзу через лимитер аккаунта, circuit breaker и повторы.
+        send — функция от токена (None, если authorized=False), создающая запрос: для повтора
+        нужна новая корутина. Аккаунт выбирается пулом на каждую попытку (route_key — ИНН
+        для sticky-маршрутизации), если не передан явно. hedge — только для идемпотентных GET.
+        """
+        return await resilience.gateway.call(
+            lambda: self._send_routed(send, endpoint, route_key, account, authorized),
+            retryable=_is_transient_error,
+            failed=_is_transient_response,
+            hedge=hedge,
+        )
+
+    async def _send_routed(self, send, endpoint: str, route_key: Optional[str],
+                           account: Optional[InterfaxAccount], authorized: bool):
+        account = account or self.accounts.pick(route_key)
+        token = await self._ensure_token(account) if authorized else None
+        response = await self._send_limited(send, endpoint, account, token)
+        if token and response.status_code == 401:
+            # токен отозван раньше срока — один повтор с новым
+            logger.warning(f"🔑 Токен аккаунта {account.login} отклонён, повторная авторизация")
+            account.invalidate_token(token)
+            token = await self._ensure_token(account)
+            response = await self._send_limited(send, endpoint, account, token)
+        return response
+
+    async def _send_limited(self, send, endpoint: str, account: InterfaxAccount, token: Optional[str]):
+        with tracer.start_as_current_span(f"interfax.{endpoint}", attributes={"interfax.account": account.login}) as span:
+            queued = time.perf_counter()
+            account.enter()
+            try:
+                with profiler.slow_op("limiter_wait", endpoint=endpoint):
+                    await account.semaphore.acquire()
+                try:
+                    await asyncio.sleep(0.2)  # 5 запросов в секунду на аккаунт
+                    waited = time.perf_counter() - queued
+                    LIMITER_WAIT.observe(waited)
+                    span.set_attribute("limiter.wait_ms", round(waited * 1000, 1))
+                    LIMITER_IN_FLIGHT.inc()
+                    started = time.perf_counter()
+                    status = "error"
+                    retry_after = None
+                    try:
+                        response = await send(token)
+                        status = response.status_code
+                        retry_after = _retry_after(response)
+                        span.set_attributes({"http.status_code": status, "http.response_bytes": len(response.content)})
+                        return response
+                    finally:
+                        LIMITER_IN_FLIGHT.dec()
+                        INTERFAX_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+                        INTERFAX_REQUESTS.inc(endpoint=endpoint, status=status)
+                        account.record(status, retry_after)
+                finally:
+                    account.semaphore.release()
+            finally:
+                account.leave()
+
+    async def _get_events(self, params: dict, conditional: bool = True) -> list[dict]:
+        """
+        GET /disclosure/events с условными заголовками: если шлюз вернул ETag/Last-Modified,
+        повторный опрос с теми же параметрами отправляет If-None-Match/If-Modified-Since
+        и при 304 использует закэшированное тело. conditional=False — для разовых запросов
+        (страницы истории), чтобы не занимать ими кэш валидаторов.
+        """
+        headers = {}
+        key = str(httpx.QueryParams(params))
+        cached = self._validators.get(key) if conditional else None
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = await self._limited_request(lambda token: self._client.get(
+            f"{self.BASE_URL}/disclosure/events", headers={**headers, "APIKey": token}, params=params
+        ), endpoint="events", hedge=True, route_key=params["subjectCode"][0], authorized=True)
+
+        if response.status_code == 304 and cached:
+            self._validators.move_to_end(key)
+            body = cached[2]
+        else:
+            response.raise_for_status()
+            body = response.content
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if conditional and (etag or last_modified):
+                self._remember_validators(key, etag, last_modified, body)
+
+        with profiler.slow_op("parse_events", params=key, size=len(body)):
+            events = json.loads(body)
+        if self.on_subjects:
+            self.on_subjects(event.get("subject") for event in events)
+        return events
+
+    def _remember_validators(self, key: str, etag: Optional[str], last_modified: Optional[str], body: bytes):
+        """LRU по числу записей и по суммарному размеру тел: 4096 полных ответов заняли бы сотни МБ."""
+        previous = self._validators.pop(key, None)
+        if previous:
+            self._validators_bytes -= len(previous[2])
+        if len(body) > self.VALIDATOR_CACHE_MAX_BYTES:
+            return
+        self._validators[key] = (etag, last_modified, body)
+        self._validators_bytes += len(body)
+        while len(self._validators) > self.VALIDATOR_CACHE_SIZE or self._validators_bytes > self.VALIDATOR_CACHE_MAX_BYTES:
+            _, (_, _, evicted) = self._validators.popitem(last=False)
+            self._validators_bytes -= len(evicted)
+
+    async def _authorize(self, account: InterfaxAccount):
+        logger.info(f"🔐 Авторизация в Интерфакс API ({account.login})...")
+        # без breaker и повторов: авторизация идёт внутри попытки запроса, который её потребовал,
+        # и вложенный gateway.call занял бы пробный слот half-open повторно
+        response = await self._send_limited(lambda _: self._client.post(
             f"{self.BASE_URL}/auth",
-            json={"login": self._login, "password": self._password}
-        ))
+            json={"login": account.login, "password": account.password}
+        ), "auth", account, None)
         response.raise_for_status()
         data = TokenResponse.model_validate(response.json())
-        save_token_to_file(data.token, data.expirationDate.isoformat())
-        self._token = data.token
-        logger.success(f"✅ Токен получен. Действует до {data.expirationDate}")
-        return self._token
-
-    async def get_token(self) -> str:
-        token, exp_str = load_token_from_file()
-        if not token or is_token_expired(exp_str):
-            return await self._authorize()
-        self._token = token
-        return self._token
+        account.set_token(data.token, data.expirationDate)
+        logger.success(f"✅ Токен {account.login} получен. Действует до {data.expirationDate}")
+
+    async def _ensure_token(self, account: InterfaxAccount) -> str:
+        if not account.token_valid():
+            async with account.auth_lock:  # остальные запросы аккаунта ждут одну авторизацию
+                if not account.token_valid():
+                    await self._authorize(account)
+        return account.token
 
     async def get_file_events(self, subject_code: str, count: int = 100) -> list[dict]:
-        token = await self.get_token()
-        headers = {"APIKey": token}
         params = {
             "entity": "Files",
             "subjectCode": [subject_code],
             "count": count
         }
-        response = await self._limited_request(self._client.get(
-            f"{self.BASE_URL}/disclosure/events", headers=headers, params=params
-        ))
-        response.raise_for_status()
-        events = response.json()
+        events = await self._get_events(params)
 
         today = datetime.utcnow().date()
         filtered = []
@@ -106,16 +294,47 @@ class InterfaxClient:
 
         return filtered
 
+    async def get_events_page(
+        self, subject_code: str, date_from: date, date_to: date, count: int = 100, skip: int = 0
+    ) -> tuple[list[dict], bool]:
+        """
+        Страница событий компании за период (для загрузки истории). Возвращает события
+        с DatePub в [date_from, date_to] и признак, есть ли смысл запрашивать следующую
+        страницу. Период дополнительно проверяется на нашей стороне — события идут
+        от новых к старым, и страница целиком старше date_from завершает обход.
+        """
+        params = {
+            "entity": "Files",
+            "subjectCode": [subject_code],
+            "dateFrom": date_from.isoformat(),
+            "dateTo": date_to.isoformat(),
+            "count": count,
+            "skip": skip,
+        }
+        events = await self._get_events(params, conditional=False)
+
+        filtered = []
+        oldest = None
+        for event in events:
+            file = event.get("file")
+            if not file or not file.get("publicUrl"):
+                continue
+            attrs = {a["name"]: a["value"] for a in file.get("attributes", [])}
+            file["attributes"] = attrs
+            try:
+                pub_date = datetime.strptime(attrs.get("DatePub", ""), "%d.%m.%Y").date()
+            except ValueError:
+                continue
+            oldest = pub_date if oldest is None else min(oldest, pub_date)
+            if date_from <= pub_date <= date_to:
+                filtered.append(event)
+
+        has_more = len(events) >= count and (oldest is None or oldest >= date_from)
+        return filtered, has_more
+
     async def probe_company_info(self, subject_code: str) -> Optional[dict]:
-        token = await self.get_token()
-        headers = {"APIKey": token}
         params = {"entity": "Files", "subjectCode": [subject_code], "count": 1}
-
-        response = await self._limited_request(self._client.get(
-            f"{self.BASE_URL}/disclosure/events", headers=headers, params=params
-        ))
-        response.raise_for_status()
-        events = response.json()
+        events = await self._get_events(params)
 
         for event in events:
             subject = event.get("subject")
@@ -126,15 +345,8 @@ class InterfaxClient:
     async def search_reports_by_category(
         self, subject_code: str, category_name: str, year: int, count: int = 100
     ) -> list[dict]:
-        token = await self.get_token()
-        headers = {"APIKey": token}
         params = {"entity": "Files", "subjectCode": [subject_code], "count": count}
-
-        response = await self._limited_request(self._client.get(
-            f"{self.BASE_URL}/disclosure/events", headers=headers, params=params
-        ))
-        response.raise_for_status()
-        events = response.json()
+        events = await self._get_events(params)
 
         results = []
         for event in events:
@@ -156,81 +368,176 @@ class InterfaxClient:
 
         return results
 
-    async def download_and_extract_file(self, file_data: dict) -> list[str]:
+    def _known_bad(self, public_url: str) -> Optional[str]:
+        entry = self._bad_urls.get(public_url)
+        if entry is None:
+            return None
+        expires, reason = entry
+        if time.monotonic() > expires:
+            del self._bad_urls[public_url]
+            return None
+        return reason
+
+    def _remember_bad(self, public_url: str, reason: str):
+        if not self._bad_url_ttl:
+            return
+        self._bad_urls[public_url] = (time.monotonic() + self._bad_url_ttl, reason)
+        self._bad_urls.move_to_end(public_url)
+        while len(self._bad_urls) > self.BAD_URL_CACHE_SIZE:
+            self._bad_urls.popitem(last=False)
+
+    async def _download_limited(self, public_url: str):
+        """Попытка скачивания через собственный лимитер хоста файлов (не через пул аккаунтов)."""
+        with tracer.start_as_current_span("interfax.download"):
+            async with self._download_semaphore:
+                started = time.perf_counter()
+                status = "error"
+                try:
+                    fetched = await self._stream_file(public_url)
+                    status = fetched.status_code
+                    return fetched
+                except ContentRejected:
+                    status = "rejected"
+                    raise
+                finally:
+                    INTERFAX_LATENCY.observe(time.perf_counter() - started, endpoint="download")
+                    INTERFAX_REQUESTS.inc(endpoint="download", status=status)
+
+    async def _stream_file(self, public_url: str):
         """
-        Скачивает файл по publicUrl. Поддерживает:
+        Одна попытка скачивания: тип и размер проверяются по заголовкам и первым байтам,
+        неподходящий ответ прерывается ContentRejected без чтения остального тела.
+        Ответ с ошибкой возвращается как есть — его разбирают повторы и raise_for_status.
+        """
+        request = self._download_client.build_request("GET", public_url)
+        response = await self._download_client.send(request, stream=True)
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+                return response
+            content, suffix = await read_checked(response, self._max_download_bytes)
+            return _DownloadedFile(response.status_code, content, suffix)
+        finally:
+            await response.aclose()
+
+    async def _fetch_file(self, public_url: str) -> Optional[tuple[bytes, str]]:
+        """Скачивает файл и определяет его тип. None — HTML, неизвестный формат или файл больше лимита."""
+        reason = self._known_bad(public_url)
+        if reason:
+            logger.info(f"⏭ Пропуск {public_url}: {reason} (проверено ранее)")
+            DOWNLOAD_RESULTS.inc(result="known_bad")
+            return None
+
+        started = time.perf_counter()
+        try:
+            fetched = await resilience.download_host.call(
+                lambda: self._download_limited(public_url),
+                retryable=_is_transient_error,
+                failed=_is_transient_response,
+                hedge=True,
+            )
+        except ContentRejected as e:
+            logger.warning(f"⚠️ Скачивание прервано, {e}: {public_url}")
+            DOWNLOAD_RESULTS.inc(result=e.reason)
+            # HTML — обычно страница ошибки или капча, часто временная: следующий цикл пробует снова
+            if e.reason != "html":
+                self._remember_bad(public_url, str(e))
+            return None
+
+        if isinstance(fetched, httpx.Response):
+            if fetched.status_code in (404, 410):
+                self._remember_bad(public_url, f"HTTP {fetched.status_code}")
+            fetched.raise_for_status()
+        DOWNLOAD_LATENCY.observe(time.perf_counter() - started)
+        DOWNLOAD_BYTES.inc(len(fetched.content))
+        return fetched.content, fetched.suffix
+
+    async def download_and_extract_file(self, file_data: dict, workspace: Workspace) -> list[ReportFile]:
+        """
+        Скачивает файл по publicUrl в рабочую область задачи. Поддерживает:
         - PDF
         - ZIP, 7Z (если установлен py7zr)
-        - HTML → пропуск
-        Возвращает список файлов.
+        - HTML, неизвестные форматы, файлы больше лимита → пропуск (скачивание прерывается)
+        Возвращает список документов (небольшие — в памяти, крупные — на диске).
         """
+        with tracer.start_as_current_span("download_and_extract", attributes={"url": file_data.get("publicUrl")}) as span:
+            files = await self._download_and_extract_file(file_data, workspace, span)
+            span.set_attributes({"files": len(files), "bytes_extracted": sum(f.size for f in files)})
+            return files
+
+    async def _download_and_extract_file(self, file_data: dict, workspace: Workspace, span) -> list[ReportFile]:
         public_url = file_data.get("publicUrl")
         file_name = file_data.get("type", {}).get("name", "report").replace(" ", "_")
         uid = file_data.get("uid", "")[:6]
         base_name = f"{file_name}_{uid}"
 
         try:
-            response = await self._limited_request(httpx.AsyncClient(timeout=60).get(
-                public_url, headers={"User-Agent": "Mozilla/5.0"}, follow_redirects=True
-            ))
-
-            response.raise_for_status()
-            content = response.content
-            content_type = response.headers.get("Content-Type", "").lower()
-
-            if content[:15].lower().startswith(b'<!doctype html') or b'<html' in content[:200].lower():
-                logger.warning(f"⚠️ Вместо файла получен HTML: {public_url}")
-                return []
-
-            # Определяем расширение
-            if b'%pdf' in content[:1024]:
-                suffix = ".pdf"
-            elif b'7z' in content[:8]:
-                suffix = ".7z"
-            elif b'pk' in content[:4].lower() or "zip" in content_type:
-                suffix = ".zip"
+            cache_key = file_cache.key(public_url) if file_cache else None
+            cached = await asyncio.to_thread(file_cache.get, cache_key) if cache_key else None
+            if cached:
+                content, suffix = cached
+                span.set_attribute("cache_hit", True)
+                DOWNLOAD_RESULTS.inc(result="cache_hit")
+                logger.info(f"🗃 Файл из кэша: {base_name + suffix} ({len(content)} байт)")
             else:
-                suffix = ".bin"
-
-            bin_path = os.path.join(tempfile.gettempdir(), base_name + suffix)
-            with open(bin_path, "wb") as f:
-                f.write(content)
-
-            logger.info(f"📥 Файл скачан: {bin_path}")
-
+                fetched = await self._fetch_file(public_url)
+                if fetched is None:
+                    return []
+                content, suffix = fetched
+                span.set_attribute("cache_hit", False)
+                logger.info(f"📥 Файл скачан: {base_name + suffix} ({len(content)} байт)")
+                if cache_key and (suffix == ".pdf" or suffix in SUPPORTED_SUFFIXES):
+                    try:
+                        await asyncio.to_thread(file_cache.put, cache_key, content, suffix, public_url)
+                    except OSError as e:
+                        logger.warning(f"⚠️ Не удалось сохранить файл в кэш: {e}")
+
+            span.set_attributes({"bytes": len(content), "format": suffix.lstrip(".")})
             if suffix == ".pdf":
-                return [bin_path]
-
-            extracted_dir = os.path.join(tempfile.gettempdir(), f"unzipped_{uid}")
-            os.makedirs(extracted_dir, exist_ok=True)
+                DOWNLOAD_RESULTS.inc(result="pdf")
+                return [workspace.add_bytes(base_name + suffix, content)]
 
-            if suffix == ".zip":
-                with zipfile.ZipFile(bin_path, 'r') as zip_ref:
-                    zip_ref.extractall(extracted_dir)
-            elif suffix == ".7z" and _has_7z:
-                with py7zr.SevenZipFile(bin_path, mode='r') as archive:
-                    archive.extractall(path=extracted_dir)
-            else:
+            if suffix not in SUPPORTED_SUFFIXES:
                 logger.warning(f"⚠️ Расширение {suffix} не поддерживается.")
+                DOWNLOAD_RESULTS.inc(result="unsupported")
                 return []
 
-            extracted_files = [
-                os.path.join(root, file)
-                for root, _, files in os.walk(extracted_dir)
-                for file in files
-            ]
+            # члены архива читаются по одному, на диск попадают только крупные
+            with profiler.slow_op("extract", url=public_url), EXTRACT_LATENCY.time(format=suffix.lstrip(".")), \
+                    tracer.start_as_current_span("extract", attributes={"format": suffix.lstrip(".")}):
+                extracted_files = extract_members(content, suffix, workspace)
+            DOWNLOAD_RESULTS.inc(result=suffix.lstrip("."))
 
             if not extracted_files:
-                logger.warning(f"⚠️ В архиве {bin_path} нет файлов.")
+                logger.warning(f"⚠️ В архиве {base_name + suffix} нет файлов.")
 
             return extracted_files
 
+        except CircuitOpenError as e:
+            logger.warning(f"⚡️ Скачивание пропущено: {e}")
+            DOWNLOAD_RESULTS.inc(result="circuit_open")
+            span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e))
+            return []
         except httpx.HTTPError as e:
             logger.error(f"❌ HTTP ошибка при скачивании: {e}")
+            DOWNLOAD_RESULTS.inc(result="http_error")
+            span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e))
+            return []
+        except WorkspaceQuotaError as e:
+            logger.error(f"❌ Нет места для распаковки {public_url}: {e}")
+            DOWNLOAD_RESULTS.inc(result="quota")
+            span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e))
             return []
         except Exception as e:
             logger.error(f"❌ Общая ошибка при скачивании: {e}")
+            DOWNLOAD_RESULTS.inc(result="error")
+            span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e))
             return []
 
     async def close(self):
         await self._client.aclose()
+        await self._download_client.aclose()
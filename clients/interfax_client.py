@@ -5,7 +5,19 @@ _config = load_config()
 
 interfax_client = InterfaxClient(
     login=_config.interfax.login,
-    password=_config.interfax.password
+    password=_config.interfax.password,
+    http2=_config.interfax.http2,
+    max_connections=_config.interfax.max_connections,
+    max_keepalive_connections=_config.interfax.max_keepalive_connections,
+    keepalive_expiry=_config.interfax.keepalive_expiry,
+    connect_timeout=_config.interfax.connect_timeout,
+    read_timeout=_config.interfax.read_timeout,
+    max_download_mb=_config.interfax.max_download_mb,
+    bad_url_ttl_hours=_config.interfax.bad_url_ttl_hours,
+    accounts=_config.interfax.accounts,
+    routing=_config.interfax.routing,
+    account_concurrency=_config.interfax.account_concurrency,
+    account_cooldown=_config.interfax.account_cooldown_seconds,
 )
 
 
@@ -1,6 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
+import hashlib
+import json
 import os
+import socket
 
 load_dotenv()
 
@@ -8,20 +11,194 @@ load_dotenv()
 class InterfaxConfig:
     login: str
     password: str
+    http2: bool = False
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    max_download_mb: int = 200  # 0 — без ограничения
+    bad_url_ttl_hours: float = 24  # 0 — не запоминать неудачные ссылки
+    accounts: list[tuple[str, str]] = field(default_factory=list)  # пусто — только login/password
+    routing: str = "least_loaded"  # least_loaded | sticky
+    account_concurrency: int = 5
+    account_cooldown_seconds: float = 60
+
+@dataclass
+class WorkerConfig:
+    role: str  # all | bot | worker
+    worker_id: str
+    lease_seconds: int
+    fsm_storage: str  # memory | sqlite
+
+@dataclass
+class ProfilingConfig:
+    directory: str
+    every_n_cycles: int  # 0 — циклы не профилируются (кроме запуска через файл-триггер)
+    handler_sample_rate: float  # доля профилируемых апдейтов, 0.0–1.0
+    keep_files: int
+    slow_op_threshold_ms: int  # 0 — журнал медленных операций выключен
+
+@dataclass
+class RetentionConfig:
+    processed_events_days: int
+    messages_days: int
+    reports_days: int  # 0 — отчёты не архивируются
+    interval_hours: int
+    vacuum_pages: int
+
+@dataclass
+class TracingConfig:
+    exporter: str  # none | console | file
+    file: str
+
+@dataclass
+class DigestConfig:
+    window_minutes: int  # 0 — дайджест выключен, каждый документ отправляется сразу
+    flush_interval_seconds: int
+
+@dataclass
+class DeliveryConfig:
+    link_threshold_mb: int  # файлы крупнее — ссылкой на MinIO; 0 — ссылки только сверх лимита Bot API
+    link_max_files: int  # у события больше файлов — все ссылками; 0 — без ограничения
+    link_expiry_hours: int
+    send_file_button: bool  # кнопка «прислать файлом» под ссылками
+
+@dataclass
+class WebhookConfig:
+    url: str  # внешний адрес, на который Telegram шлёт апдейты (https://bot.example.com)
+    path: str
+    host: str
+    port: int
+    secret: str  # X-Telegram-Bot-Api-Secret-Token, одинаковый у всех реплик
+    max_connections: int
+
+@dataclass
+class ResilienceConfig:
+    retry_attempts: int  # всего попыток, включая первую
+    retry_base_delay: float
+    retry_max_delay: float
+    retry_budget: float  # повторов на первичный вызов в среднем
+    breaker_failures: int
+    breaker_reset_seconds: float
+    hedge_percentile: float  # 0 — hedged-запросы выключены
+    hedge_min_samples: int
+
+@dataclass
+class JobsConfig:
+    workers: int
+    queue_size: int  # 0 — без ограничения
+    per_user: int
+    timeout_seconds: int  # 0 — без ограничения
 
 @dataclass
 class BotConfig:
     token: str
+    update_mode: str  # polling | webhook
+    webhook: WebhookConfig
     interfax: InterfaxConfig
     interval_minutes: int
+    worker: WorkerConfig
+    metrics_port: int  # 0 — эндпоинт /metrics выключен
+    profiling: ProfilingConfig
+    retention: RetentionConfig
+    tracing: TracingConfig
+    digest: DigestConfig
+    delivery: DeliveryConfig
+    resilience: ResilienceConfig
+    jobs: JobsConfig
+
+def _interfax_accounts() -> list[tuple[str, str]]:
+    """INTERFAX_ACCOUNTS — JSON-список [{"login": ..., "password": ...}, ...]."""
+    raw = os.getenv("INTERFAX_ACCOUNTS", "").strip()
+    if not raw:
+        return []
+    return [(item["login"], item["password"]) for item in json.loads(raw)]
+
 
 def load_config() -> BotConfig:
+    role = os.getenv("BOT_ROLE", "all")
+    token = os.getenv("BOT_TOKEN", "")
+    update_mode = os.getenv("BOT_UPDATE_MODE", "polling")
     return BotConfig(
-        token=os.getenv("BOT_TOKEN", ""),
+        token=token,
+        update_mode=update_mode,
+        webhook=WebhookConfig(
+            url=os.getenv("WEBHOOK_URL", ""),
+            path=os.getenv("WEBHOOK_PATH", "/telegram/webhook"),
+            host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8080")),
+            # по умолчанию выводится из токена: стабилен между репликами и не хранится отдельно
+            secret=os.getenv("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{token}".encode()).hexdigest(),
+            max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+        ),
         interfax=InterfaxConfig(
             login=os.getenv("INTERFAX_LOGIN", ""),
-            password=os.getenv("INTERFAX_PASSWORD", "")
+            password=os.getenv("INTERFAX_PASSWORD", ""),
+            http2=os.getenv("INTERFAX_HTTP2", "0") == "1",
+            max_connections=int(os.getenv("INTERFAX_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("INTERFAX_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("INTERFAX_KEEPALIVE_EXPIRY", "30")),
+            connect_timeout=float(os.getenv("INTERFAX_CONNECT_TIMEOUT", "10")),
+            read_timeout=float(os.getenv("INTERFAX_READ_TIMEOUT", "60")),
+            max_download_mb=int(os.getenv("INTERFAX_MAX_DOWNLOAD_MB", "200")),
+            bad_url_ttl_hours=float(os.getenv("INTERFAX_BAD_URL_TTL_HOURS", "24")),
+            accounts=_interfax_accounts(),
+            routing=os.getenv("INTERFAX_ROUTING", "least_loaded"),
+            account_concurrency=int(os.getenv("INTERFAX_ACCOUNT_CONCURRENCY", "5")),
+            account_cooldown_seconds=float(os.getenv("INTERFAX_ACCOUNT_COOLDOWN_SECONDS", "60")),
+        ),
+        interval_minutes=int(os.getenv("DISPATCH_INTERVAL_MINUTES", "15")),
+        worker=WorkerConfig(
+            role=role,
+            worker_id=os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}"),
+            lease_seconds=int(os.getenv("WORKER_LEASE_SECONDS", "600")),
+            # при раздельных ролях и репликах за webhook состояние FSM должно быть общим
+            fsm_storage=os.getenv("FSM_STORAGE", "memory" if role == "all" and update_mode == "polling" else "sqlite"),
+        ),
+        metrics_port=int(os.getenv("METRICS_PORT", "0")),
+        profiling=ProfilingConfig(
+            directory=os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "profiles")),
+            every_n_cycles=int(os.getenv("PROFILE_EVERY_N_CYCLES", "0")),
+            handler_sample_rate=float(os.getenv("PROFILE_HANDLER_SAMPLE_RATE", "0")),
+            keep_files=int(os.getenv("PROFILE_KEEP_FILES", "50")),
+            slow_op_threshold_ms=int(os.getenv("SLOW_OP_THRESHOLD_MS", "0")),
+        ),
+        retention=RetentionConfig(
+            processed_events_days=int(os.getenv("RETENTION_PROCESSED_EVENTS_DAYS", "30")),
+            messages_days=int(os.getenv("RETENTION_MESSAGES_DAYS", "365")),
+            reports_days=int(os.getenv("RETENTION_REPORTS_DAYS", "0")),
+            interval_hours=int(os.getenv("RETENTION_INTERVAL_HOURS", "24")),
+            vacuum_pages=int(os.getenv("RETENTION_VACUUM_PAGES", "2000")),
+        ),
+        tracing=TracingConfig(
+            exporter=os.getenv("TRACING_EXPORTER", "none"),
+            file=os.getenv("TRACING_FILE", os.path.join(os.path.dirname(__file__), "..", "data", "traces", "spans.jsonl")),
+        ),
+        digest=DigestConfig(
+            window_minutes=int(os.getenv("DIGEST_WINDOW_MINUTES", "0")),
+            flush_interval_seconds=int(os.getenv("DIGEST_FLUSH_INTERVAL_SECONDS", "60")),
+        ),
+        delivery=DeliveryConfig(
+            link_threshold_mb=int(os.getenv("LINK_DELIVERY_MB", "20")),
+            link_max_files=int(os.getenv("LINK_DELIVERY_MAX_FILES", "5")),
+            link_expiry_hours=int(os.getenv("LINK_EXPIRY_HOURS", "72")),
+            send_file_button=os.getenv("LINK_SEND_FILE_BUTTON", "1") == "1",
+        ),
+        resilience=ResilienceConfig(
+            retry_attempts=int(os.getenv("RESILIENCE_RETRY_ATTEMPTS", "3")),
+            retry_base_delay=float(os.getenv("RESILIENCE_RETRY_BASE_DELAY", "0.5")),
+            retry_max_delay=float(os.getenv("RESILIENCE_RETRY_MAX_DELAY", "10")),
+            retry_budget=float(os.getenv("RESILIENCE_RETRY_BUDGET", "0.2")),
+            breaker_failures=int(os.getenv("RESILIENCE_BREAKER_FAILURES", "5")),
+            breaker_reset_seconds=float(os.getenv("RESILIENCE_BREAKER_RESET_SECONDS", "60")),
+            hedge_percentile=float(os.getenv("RESILIENCE_HEDGE_PERCENTILE", "0")),
+            hedge_min_samples=int(os.getenv("RESILIENCE_HEDGE_MIN_SAMPLES", "20")),
+        ),
+        jobs=JobsConfig(
+            workers=int(os.getenv("JOBS_WORKERS", "8")),
+            queue_size=int(os.getenv("JOBS_QUEUE_SIZE", "200")),
+            per_user=int(os.getenv("JOBS_PER_USER", "1")),
+            timeout_seconds=int(os.getenv("JOBS_TIMEOUT_SECONDS", "600")),
         ),
-        interval_minutes=int(os.getenv("DISPATCH_INTERVAL_MINUTES", "15"))
     )
-
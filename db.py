@@ -1,16 +1,24 @@
+import os
 import sqlite3
+import time
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent.parent / "data" / "bot.db"
+from loguru import logger
+
+from utils.metrics import observe_db
+
+DB_PATH = Path(os.getenv("BOT_DB_PATH", Path(__file__).parent.parent / "data" / "bot.db"))
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
+    # timeout — ожидание блокировки, когда базу одновременно пишут несколько процессов
+    conn = sqlite3.connect(DB_PATH, timeout=30)
     conn.row_factory = sqlite3.Row
     return conn
 
 def init_db():
     with get_db() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
@@ -62,7 +70,312 @@ def init_db():
             CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_user_company
             ON user_companies(user_id, inn);
         """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS worker_leases (
+                worker_id TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS inn_leases (
+                inn TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT
+            );
+        """)
+
+    migrate()
+
+
+# --- Миграции схемы ---
+# Базовая схема выше создаётся через IF NOT EXISTS; всё, что меняет существующие таблицы,
+# добавляется только новой функцией в конец MIGRATIONS. Номер последней применённой
+# миграции хранится в PRAGMA user_version.
+
+def _migration_1_timestamps_and_indexes(conn):
+    # ALTER TABLE не допускает DEFAULT CURRENT_TIMESTAMP — заполняем существующие строки вручную
+    conn.execute("ALTER TABLE processed_events ADD COLUMN processed_at TIMESTAMP")
+    conn.execute("UPDATE processed_events SET processed_at = CURRENT_TIMESTAMP WHERE processed_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_processed_events_processed_at ON processed_events(processed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_inn_report_date ON reports(inn, report_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_companies_inn ON user_companies(inn)")
+
+def _migration_2_incremental_vacuum(conn):
+    # режим вступает в силу после VACUUM, который выполняется вне транзакции в migrate()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
 
+def _migration_3_report_files(conn):
+    # все файлы события в MinIO (у архивов их несколько), чтобы отдавать их повторно без шлюза
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_files (
+            event_uid TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            object_name TEXT NOT NULL,
+            size INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (event_uid, object_name)
+        );
+    """)
+
+
+def _migration_4_digest_queue(conn):
+    # документы, ожидающие отправки пользователю дайджестом (сами файлы уже лежат в MinIO)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS digest_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            event_uid TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            object_name TEXT NOT NULL,
+            summary TEXT,
+            published_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            queued_at REAL NOT NULL
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_digest_queue_user ON digest_queue(user_id, queued_at)")
+
+
+def _migration_5_content_hash_and_backfill(conn):
+    # sha256 содержимого — чтобы одинаковые документы хранились в MinIO один раз
+    conn.execute("ALTER TABLE report_files ADD COLUMN sha256 TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_files_sha256 ON report_files(sha256)")
+    # прогресс загрузки истории: job — диапазон дат, next_skip — следующая страница событий
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            job TEXT NOT NULL,
+            inn TEXT NOT NULL,
+            next_skip INTEGER NOT NULL DEFAULT 0,
+            events INTEGER NOT NULL DEFAULT 0,
+            done BOOLEAN NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job, inn)
+        );
+    """)
+
+
+def _migration_6_issuers(conn):
+    # справочник эмитентов для поиска компании по названию без запроса к шлюзу
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS issuers (
+            inn TEXT PRIMARY KEY,
+            ogrn TEXT,
+            short_name TEXT,
+            full_name TEXT,
+            updated_at REAL NOT NULL
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issuers_updated_at ON issuers(updated_at)")
+    # начальное наполнение — компании, которые уже добавляли пользователи или присылала рассылка
+    now = time.time()
+    conn.execute("""
+        INSERT OR IGNORE INTO issuers (inn, ogrn, short_name, updated_at)
+        SELECT inn, MAX(ogrn), MAX(company_name), ? FROM user_companies GROUP BY inn
+    """, (now,))
+    conn.execute("""
+        INSERT OR IGNORE INTO issuers (inn, short_name, updated_at)
+        SELECT inn, MAX(company_name), ? FROM reports WHERE inn IS NOT NULL AND inn != '' GROUP BY inn
+    """, (now,))
+
+
+def _migration_7_report_files_id(conn):
+    # явный id вместо неявного rowid: на него ссылаются кнопки sendfile_<id> в отправленных
+    # сообщениях, а rowid таблицы с составным ключом VACUUM может перенумеровать.
+    # Существующие rowid переносятся в id, уже отправленные кнопки продолжают работать.
+    conn.execute("""
+        CREATE TABLE report_files_new (
+            id INTEGER PRIMARY KEY,
+            event_uid TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            object_name TEXT NOT NULL,
+            size INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sha256 TEXT,
+            UNIQUE (event_uid, object_name)
+        );
+    """)
+    conn.execute("""
+        INSERT INTO report_files_new (id, event_uid, filename, object_name, size, created_at, sha256)
+        SELECT rowid, event_uid, filename, object_name, size, created_at, sha256 FROM report_files
+    """)
+    conn.execute("DROP TABLE report_files")
+    conn.execute("ALTER TABLE report_files_new RENAME TO report_files")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_files_sha256 ON report_files(sha256)")
+
+
+def _migration_8_jobs(conn):
+    # фоновые задачи всех реплик бота: лимит на пользователя и отмена работают, даже если
+    # кнопка «Отменить» пришла в другую реплику; expires_at продлевает реплика-владелец
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            replica TEXT NOT NULL,
+            cancelled BOOLEAN NOT NULL DEFAULT 0,
+            expires_at REAL NOT NULL
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_replica ON jobs(replica)")
+
+
+MIGRATIONS = [
+    _migration_1_timestamps_and_indexes,
+    _migration_2_incremental_vacuum,
+    _migration_3_report_files,
+    _migration_4_digest_queue,
+    _migration_5_content_hash_and_backfill,
+    _migration_6_issuers,
+    _migration_7_report_files_id,
+    _migration_8_jobs,
+]
+
+
+def migrate():
+    conn = get_db()
+    conn.isolation_level = None  # транзакциями управляем сами
+    try:
+        # BEGIN IMMEDIATE — чтобы несколько процессов не применили одну миграцию дважды
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        try:
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                logger.info(f"🗄 Применена миграция БД #{number}: {migration.__name__}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logger.info("🗄 VACUUM для перехода на incremental auto_vacuum...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+# --- Очистка старых данных ---
+
+@observe_db
+def prune_processed_events(older_than_days: int) -> int:
+    with get_db() as conn:
+        return conn.execute(
+            "DELETE FROM processed_events WHERE processed_at < datetime('now', ?)",
+            (f"-{older_than_days} days",)
+        ).rowcount
+
+@observe_db
+def prune_messages(older_than_days: int) -> int:
+    with get_db() as conn:
+        return conn.execute(
+            "DELETE FROM messages WHERE created_at < datetime('now', ?)",
+            (f"-{older_than_days} days",)
+        ).rowcount
+
+@observe_db
+def archive_reports(older_than_days: int, archive_path: Path) -> int:
+    """Переносит старые отчёты в отдельную базу-архив (та же схема таблицы reports)."""
+    conn = get_db()
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (str(archive_path),))
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS archive.reports AS SELECT * FROM main.reports WHERE 0")
+            cutoff = (f"-{older_than_days} days",)
+            conn.execute(
+                "INSERT OR IGNORE INTO archive.reports SELECT * FROM main.reports WHERE created_at < datetime('now', ?)",
+                cutoff
+            )
+            moved = conn.execute(
+                "DELETE FROM main.reports WHERE created_at < datetime('now', ?)", cutoff
+            ).rowcount
+        conn.execute("DETACH DATABASE archive")
+        return moved
+    finally:
+        conn.close()
+
+@observe_db
+def prune_expired_leases() -> int:
+    now = time.time()
+    with get_db() as conn:
+        deleted = conn.execute("DELETE FROM worker_leases WHERE expires_at < ?", (now,)).rowcount
+        deleted += conn.execute("DELETE FROM inn_leases WHERE expires_at < ?", (now,)).rowcount
+        return deleted
+
+@observe_db
+def incremental_vacuum(pages: int):
+    conn = get_db()
+    try:
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    finally:
+        conn.close()
+
+
+@observe_db
+def is_user_subscribed(user_id: int) -> bool:
+    with get_db() as conn:
+        res = conn.execute(
+            "SELECT is_subscribed FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return bool(res["is_subscribed"]) if res else False
+
+@observe_db
+def set_subscription(user_id: int, full_name: str, subscribed: bool):
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO users (user_id, full_name, is_subscribed)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET is_subscribed = excluded.is_subscribed
+        """,
+            (user_id, full_name, int(subscribed)),
+        )
+
+@observe_db
+def load_subscription_snapshot() -> tuple[list[dict], list[dict]]:
+    """Все пользователи и все компании пользователей — для реестра подписок."""
+    with get_db() as conn:
+        users = conn.execute("SELECT user_id, full_name, is_subscribed FROM users").fetchall()
+        companies = conn.execute(
+            "SELECT * FROM user_companies ORDER BY created_at, id"
+        ).fetchall()
+        return [dict(row) for row in users], [dict(row) for row in companies]
+
+@observe_db
+def get_subscriptions_version() -> int:
+    with get_db() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'subscriptions_version'").fetchone()
+        return row["value"] if row else 0
+
+@observe_db
+def bump_subscriptions_version() -> int:
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO meta (key, value) VALUES ('subscriptions_version', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+            """
+        )
+        return conn.execute("SELECT value FROM meta WHERE key = 'subscriptions_version'").fetchone()["value"]
+
+@observe_db
 def add_user_company(user_id: int, inn: str, name: str, ogrn: str = None):
     with get_db() as conn:
         existing = conn.execute("""
@@ -75,6 +388,7 @@ def add_user_company(user_id: int, inn: str, name: str, ogrn: str = None):
                 VALUES (?, ?, ?, ?)
             """, (user_id, inn, name, ogrn))
 
+@observe_db
 def remove_user_company(user_id: int, inn: str):
     with get_db() as conn:
         conn.execute("""
@@ -82,6 +396,7 @@ def remove_user_company(user_id: int, inn: str):
             WHERE user_id = ? AND inn = ?
         """, (user_id, inn))
 
+@observe_db
 def list_user_companies(user_id: int) -> list[dict]:
     with get_db() as conn:
         rows = conn.execute("""
@@ -90,18 +405,21 @@ def list_user_companies(user_id: int) -> list[dict]:
         """, (user_id,)).fetchall()
         return [dict(row) for row in rows]
 
+@observe_db
 def has_event_been_processed(event_uid: str) -> bool:
     with get_db() as conn:
         res = conn.execute("SELECT 1 FROM processed_events WHERE event_uid = ?", (event_uid,)).fetchone()
         return res is not None
 
+@observe_db
 def mark_event_as_processed(event_uid: str):
     with get_db() as conn:
         conn.execute(
-            "INSERT OR IGNORE INTO processed_events (event_uid) VALUES (?)",
+            "INSERT OR IGNORE INTO processed_events (event_uid, processed_at) VALUES (?, CURRENT_TIMESTAMP)",
             (event_uid,)
         )
 
+@observe_db
 def save_report(
     event_uid: str,
     company_name: str,
@@ -130,6 +448,7 @@ def save_report(
             )
         )
 
+@observe_db
 def save_message(
     event_uid: str,
     company_name: str,
@@ -158,12 +477,147 @@ def save_message(
             )
         )
 
+@observe_db
+def save_report_file(event_uid: str, filename: str, object_name: str, size: int, sha256: str = None) -> int:
+    # UPSERT, а не INSERT OR REPLACE: id сохраняется, кнопки sendfile_<id> в отправленных сообщениях не ломаются
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO report_files (event_uid, filename, object_name, size, sha256)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(event_uid, object_name) DO UPDATE SET
+                filename = excluded.filename,
+                size = excluded.size,
+                sha256 = COALESCE(excluded.sha256, report_files.sha256)
+            """,
+            (event_uid, filename, object_name, size, sha256)
+        )
+        return conn.execute(
+            "SELECT id FROM report_files WHERE event_uid = ? AND object_name = ?", (event_uid, object_name)
+        ).fetchone()[0]
+
+@observe_db
+def find_object_by_sha256(sha256: str):
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT object_name FROM report_files WHERE sha256 = ? LIMIT 1", (sha256,)
+        ).fetchone()
+        return row["object_name"] if row else None
+
+@observe_db
+def get_report_file(file_id: int):
+    with get_db() as conn:
+        return conn.execute(
+            "SELECT * FROM report_files WHERE id = ?", (file_id,)
+        ).fetchone()
+
+@observe_db
+def get_report_files(event_uid: str) -> list[dict]:
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT * FROM report_files WHERE event_uid = ? ORDER BY id", (event_uid,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+@observe_db
+def enqueue_digest(user_ids: list[int], event_uid: str, filename: str, object_name: str,
+                   summary: str, published_at: float = None):
+    now = time.time()
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO digest_queue (user_id, event_uid, filename, object_name, summary, published_at, queued_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(user_id, event_uid, filename, object_name, summary, published_at, now) for user_id in user_ids]
+        )
+
+@observe_db
+def list_due_digest_users(window_seconds: int) -> list[int]:
+    """Пользователи, у которых самый старый документ в очереди ждёт дольше окна."""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT user_id FROM digest_queue GROUP BY user_id HAVING MIN(queued_at) <= ?",
+            (time.time() - window_seconds,)
+        ).fetchall()
+        return [row["user_id"] for row in rows]
+
+@observe_db
+def claim_digest(user_id: int) -> list[dict]:
+    """Забирает очередь пользователя одним DELETE ... RETURNING — два воркера не отправят её дважды."""
+    with get_db() as conn:
+        rows = conn.execute(
+            "DELETE FROM digest_queue WHERE user_id = ? RETURNING *", (user_id,)
+        ).fetchall()
+        return sorted((dict(row) for row in rows), key=lambda row: row["id"])
+
+@observe_db
+def requeue_digest(items: list[dict]):
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO digest_queue
+                (user_id, event_uid, filename, object_name, summary, published_at, attempts, queued_at)
+            VALUES (:user_id, :event_uid, :filename, :object_name, :summary, :published_at, :attempts, :queued_at)
+            """,
+            [{**item, "attempts": item["attempts"] + 1} for item in items]
+        )
+
+@observe_db
+def get_backfill_checkpoint(job: str, inn: str):
+    with get_db() as conn:
+        return conn.execute(
+            "SELECT * FROM backfill_checkpoints WHERE job = ? AND inn = ?", (job, inn)
+        ).fetchone()
+
+@observe_db
+def save_backfill_checkpoint(job: str, inn: str, next_skip: int, events: int, done: bool = False):
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO backfill_checkpoints (job, inn, next_skip, events, done) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(job, inn) DO UPDATE SET
+                next_skip = excluded.next_skip,
+                events = excluded.events,
+                done = excluded.done,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (job, inn, next_skip, events, done)
+        )
+
+@observe_db
+def upsert_issuers(issuers: list[dict]):
+    now = time.time()
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO issuers (inn, ogrn, short_name, full_name, updated_at)
+            VALUES (:inn, :ogrn, :short_name, :full_name, :updated_at)
+            ON CONFLICT(inn) DO UPDATE SET
+                ogrn = COALESCE(excluded.ogrn, ogrn),
+                short_name = COALESCE(excluded.short_name, short_name),
+                full_name = COALESCE(excluded.full_name, full_name),
+                updated_at = excluded.updated_at
+            """,
+            [dict(issuer, updated_at=now) for issuer in issuers]
+        )
+
+@observe_db
+def load_issuers(updated_after: float = 0) -> list[dict]:
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT * FROM issuers WHERE updated_at > ? ORDER BY updated_at", (updated_after,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+@observe_db
 def get_report_by_uid(event_uid: str):
     with get_db() as conn:
         return conn.execute(
             "SELECT * FROM reports WHERE event_uid = ?", (event_uid,)
         ).fetchone()
 
+@observe_db
 def get_last_reports(limit: int = 5):
     with get_db() as conn:
         return conn.execute(
@@ -174,3 +628,89 @@ def get_last_reports(limit: int = 5):
             """,
             (limit,)
         ).fetchall()
+
+@observe_db
+def heartbeat_worker(worker_id: str, ttl_seconds: int):
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO worker_leases (worker_id, expires_at) VALUES (?, ?)
+            ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at
+            """,
+            (worker_id, time.time() + ttl_seconds)
+        )
+
+@observe_db
+def list_live_workers() -> list[str]:
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT worker_id FROM worker_leases WHERE expires_at > ? ORDER BY worker_id",
+            (time.time(),)
+        ).fetchall()
+        return [row["worker_id"] for row in rows]
+
+def release_worker(worker_id: str):
+    with get_db() as conn:
+        conn.execute("DELETE FROM worker_leases WHERE worker_id = ?", (worker_id,))
+        conn.execute("DELETE FROM inn_leases WHERE worker_id = ?", (worker_id,))
+
+@observe_db
+def acquire_inn_lease(inn: str, worker_id: str, ttl_seconds: int) -> bool:
+    now = time.time()
+    with get_db() as conn:
+        cur = conn.execute(
+            """
+            INSERT INTO inn_leases (inn, worker_id, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(inn) DO UPDATE SET
+                worker_id = excluded.worker_id,
+                expires_at = excluded.expires_at
+            WHERE inn_leases.worker_id = excluded.worker_id OR inn_leases.expires_at < ?
+            """,
+            (inn, worker_id, now + ttl_seconds, now)
+        )
+        return cur.rowcount == 1
+
+@observe_db
+def release_inn_lease(inn: str, worker_id: str):
+    with get_db() as conn:
+        conn.execute(
+            "DELETE FROM inn_leases WHERE inn = ? AND worker_id = ?",
+            (inn, worker_id)
+        )
+
+@observe_db
+def claim_job(user_id: int, kind: str, replica: str, per_user: int, ttl_seconds: int):
+    """Регистрирует задачу, если у пользователя их меньше per_user (по всем репликам). None — лимит исчерпан."""
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+        cur = conn.execute(
+            """
+            INSERT INTO jobs (user_id, kind, replica, expires_at)
+            SELECT ?, ?, ?, ?
+            WHERE (SELECT COUNT(*) FROM jobs WHERE user_id = ?) < ?
+            """,
+            (user_id, kind, replica, now + ttl_seconds, user_id, per_user)
+        )
+        return cur.lastrowid if cur.rowcount == 1 else None
+
+@observe_db
+def heartbeat_jobs(replica: str, ttl_seconds: int) -> list[int]:
+    """Продлевает задачи реплики и возвращает id тех, что отменены (в том числе из другой реплики)."""
+    with get_db() as conn:
+        conn.execute("UPDATE jobs SET expires_at = ? WHERE replica = ?", (time.time() + ttl_seconds, replica))
+        rows = conn.execute("SELECT id FROM jobs WHERE replica = ? AND cancelled = 1", (replica,)).fetchall()
+        return [row["id"] for row in rows]
+
+@observe_db
+def cancel_job(job_id: int, user_id: int) -> bool:
+    with get_db() as conn:
+        return conn.execute(
+            "UPDATE jobs SET cancelled = 1 WHERE id = ? AND user_id = ? AND cancelled = 0 AND expires_at > ?",
+            (job_id, user_id, time.time())
+        ).rowcount == 1
+
+@observe_db
+def release_job(job_id: int):
+    with get_db() as conn:
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
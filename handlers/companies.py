@@ -1,14 +1,25 @@
 from aiogram import Router, F, types
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    InlineKeyboardMarkup,
+    InlineKeyboardButton,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from db import add_user_company, remove_user_company, list_user_companies
 from clients.interfax_client import interfax_client
-from db import get_db
+from services.issuers import issuers
+from services.subscriptions import registry
 from keyboards.main import main_menu
+from utils.metrics import ISSUER_LOOKUPS
 
 router = Router()
 
+PICK_PREFIX = "pick_company_"
+SEARCH_RESULTS = 8
+INLINE_RESULTS = 20
+
 class CompanyStates(StatesGroup):
     waiting_for_inn = State()
 
@@ -23,6 +34,19 @@ def companies_keyboard(companies: list[dict]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def matches_keyboard(matches: list[dict]) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(text=f"{issuer_name(m)} ({m['inn']})"[:64], callback_data=f"{PICK_PREFIX}{m['inn']}")]
+        for m in matches
+    ]
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_companies")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def issuer_name(issuer: dict) -> str:
+    return issuer.get("short_name") or issuer.get("full_name") or "Неизвестно"
+
+
 def back_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_companies")]]
@@ -31,7 +55,7 @@ def back_keyboard() -> InlineKeyboardMarkup:
 
 @router.callback_query(F.data == "manage_companies")
 async def manage_companies(callback: types.CallbackQuery):
-    companies = list_user_companies(callback.from_user.id)
+    companies = registry.list_companies(callback.from_user.id)
     if companies:
         await callback.message.edit_text("📄 <b>Ваши компании</b>:", reply_markup=companies_keyboard(companies))
     else:
@@ -42,7 +66,7 @@ async def manage_companies(callback: types.CallbackQuery):
 
 @router.callback_query(F.data == "add_company")
 async def ask_inn(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("✍️ Введите ИНН или ОГРН компании:", reply_markup=back_keyboard())
+    await callback.message.edit_text("✍️ Введите название, ИНН или ОГРН компании:", reply_markup=back_keyboard())
     await state.set_state(CompanyStates.waiting_for_inn)
     await callback.answer()
 
@@ -50,72 +74,132 @@ async def ask_inn(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(CompanyStates.waiting_for_inn, F.data == "back_to_companies")
 async def back_to_company_list(callback: types.CallbackQuery, state: FSMContext):
     await state.clear()
-    companies = list_user_companies(callback.from_user.id)
+    companies = registry.list_companies(callback.from_user.id)
     await callback.message.edit_text("📄 <b>Ваши компании</b>:", reply_markup=companies_keyboard(companies))
     await callback.answer()
 
 
+@router.message(Command("add"))
+async def add_command(message: types.Message, command: CommandObject, state: FSMContext):
+    """/add <ИНН> — так приходит выбранный результат inline-поиска."""
+    await state.set_state(CompanyStates.waiting_for_inn)
+    await find_or_add_company(message, state, (command.args or "").strip())
+
+
 @router.message(CompanyStates.waiting_for_inn)
 async def handle_inn_input(message: types.Message, state: FSMContext):
-    code = message.text.strip()
+    await find_or_add_company(message, state, message.text.strip())
 
-    # 🔍 Проверка на валидность (ИНН: 10 или 12 цифр, ОГРН: 13 цифр)
-    if not code.isdigit() or len(code) not in (10, 12, 13):
+
+async def find_or_add_company(message: types.Message, state: FSMContext, query: str):
+    # ИНН: 10 или 12 цифр, ОГРН: 13 цифр — добавляем сразу; иначе ищем в справочнике эмитентов
+    if query.isdigit() and len(query) in (10, 12, 13):
+        await add_company_by_code(message, state, query)
+        return
+
+    matches = issuers.search(query, limit=SEARCH_RESULTS)
+    if matches:
+        await message.answer(f"🔍 Найдено: {len(matches)}. Выберите компанию или уточните запрос:",
+                             reply_markup=matches_keyboard(matches))
+    elif query.isdigit():
         await message.answer("⚠️ Неверный формат ИНН/ОГРН. Попробуйте ещё раз:\n\n✍️ Введите ИНН или ОГРН компании:",
                              reply_markup=back_keyboard())
+    else:
+        await message.answer("🔍 Ничего не найдено. Уточните название или введите ИНН/ОГРН компании:",
+                             reply_markup=back_keyboard())
+
+
+async def add_company_by_code(message: types.Message, state: FSMContext, code: str):
+    # известный эмитент — без запроса к шлюзу
+    issuer = issuers.get(code)
+    if issuer:
+        ISSUER_LOOKUPS.inc(source="directory")
+        await add_company(message, message.from_user.id, state, issuer)
         return
 
     try:
         subject = await interfax_client.probe_company_info(code)
-        if not subject:
-            await message.answer("⚠️ Компания не найдена. Попробуйте ещё раз:\n\n✍️ Введите ИНН или ОГРН:",
-                                 reply_markup=back_keyboard())
-            return
-
-        name = subject.get("shortName") or subject.get("fullName") or "Неизвестно"
-        inn = subject.get("inn", code)
-        ogrn = subject.get("ogrn", "")
-
-        # 🔍 Проверка: уже есть в подписке?
-        companies = list_user_companies(message.from_user.id)
-        if any(c['inn'] == inn for c in companies):
-            await message.answer(
-                f"⚠️ Компания <b>{name}</b> уже есть в вашем списке.",
-                reply_markup=companies_keyboard(companies)
-            )
-            await state.clear()
-            return
-
-        # ✅ Добавляем
-        add_user_company(message.from_user.id, inn=inn, name=name, ogrn=ogrn)
-
-        companies = list_user_companies(message.from_user.id)
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при запросе: {e}")
+        await state.clear()
+        return
+
+    if not subject:
+        ISSUER_LOOKUPS.inc(source="not_found")
+        await message.answer("⚠️ Компания не найдена. Попробуйте ещё раз:\n\n✍️ Введите ИНН или ОГРН:",
+                             reply_markup=back_keyboard())
+        return
+
+    ISSUER_LOOKUPS.inc(source="gateway")
+    await add_company(message, message.from_user.id, state, {
+        "inn": subject.get("inn", code),
+        "ogrn": subject.get("ogrn", ""),
+        "short_name": subject.get("shortName"),
+        "full_name": subject.get("fullName"),
+    })
+
+
+@router.callback_query(F.data.startswith(PICK_PREFIX))
+async def pick_company(callback: types.CallbackQuery, state: FSMContext):
+    issuer = issuers.get(callback.data.removeprefix(PICK_PREFIX))
+    if issuer is None:
+        await callback.answer("⚠️ Компания не найдена, введите ИНН или ОГРН.", show_alert=True)
+        return
+    ISSUER_LOOKUPS.inc(source="directory")
+    await callback.answer()
+    await add_company(callback.message, callback.from_user.id, state, issuer)
+
+
+async def add_company(message: types.Message, user_id: int, state: FSMContext, issuer: dict):
+    name = issuer_name(issuer)
+    inn = issuer["inn"]
+
+    # 🔍 Проверка: уже есть в подписке?
+    if registry.has_company(user_id, inn):
         await message.answer(
-            f"✅ Компания <b>{name}</b> добавлена.\n\n📄 <b>Ваш список компаний:</b>",
-            reply_markup=companies_keyboard(companies)
+            f"⚠️ Компания <b>{name}</b> уже есть в вашем списке.",
+            reply_markup=companies_keyboard(registry.list_companies(user_id))
         )
         await state.clear()
+        return
 
-    except Exception as e:
-        await message.answer(f"❌ Ошибка при запросе: {e}")
-        await state.clear()
+    # ✅ Добавляем
+    registry.add_user_company(user_id, inn=inn, name=name, ogrn=issuer.get("ogrn") or "")
+
+    companies = registry.list_companies(user_id)
+    await message.answer(
+        f"✅ Компания <b>{name}</b> добавлена.\n\n📄 <b>Ваш список компаний:</b>",
+        reply_markup=companies_keyboard(companies)
+    )
+    await state.clear()
+
+
+@router.inline_query()
+async def inline_search(query: types.InlineQuery):
+    """Inline-режим (@бот название): подсказки из справочника, выбор отправляет /add <ИНН>."""
+    matches = issuers.search(query.query, limit=INLINE_RESULTS)
+    await query.answer([
+        InlineQueryResultArticle(
+            id=m["inn"],
+            title=issuer_name(m),
+            description=f"ИНН {m['inn']}" + (f" · ОГРН {m['ogrn']}" if m.get("ogrn") else ""),
+            input_message_content=InputTextMessageContent(message_text=f"/add {m['inn']}"),
+        )
+        for m in matches
+    ], cache_time=300, is_personal=False)
 
 
 @router.callback_query(F.data.startswith("del_company_"))
 async def delete_company(callback: types.CallbackQuery):
     inn = callback.data.split("_")[2]
-    remove_user_company(callback.from_user.id, inn)
-    companies = list_user_companies(callback.from_user.id)
+    registry.remove_user_company(callback.from_user.id, inn)
+    companies = registry.list_companies(callback.from_user.id)
     await callback.message.edit_text("📄 <b>Обновлён список компаний</b>:", reply_markup=companies_keyboard(companies))
     await callback.answer()
 
 
 @router.callback_query(F.data == "back_to_menu")
 async def back_to_main(callback: types.CallbackQuery):
-    user_id = callback.from_user.id
-    with get_db() as conn:
-        res = conn.execute("SELECT is_subscribed FROM users WHERE user_id = ?", (user_id,)).fetchone()
-        is_sub = bool(res["is_subscribed"]) if res else False
-
+    is_sub = registry.is_subscribed(callback.from_user.id)
     await callback.message.edit_text("📋 Главное меню:", reply_markup=main_menu(is_sub))
     await callback.answer()
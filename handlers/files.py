@@ -0,0 +1,37 @@
+# handlers/files.py
+from aiogram import F, Router, types
+from loguru import logger
+
+from db import get_report_file
+from services.delivery import SEND_FILE_PREFIX, TELEGRAM_UPLOAD_LIMIT
+from services.report_store import fetch_object
+from utils.minio_client import MINIO_ERRORS
+from utils.workspace import Workspace
+
+router = Router()
+
+
+@router.callback_query(F.data.startswith(SEND_FILE_PREFIX))
+async def send_file(callback: types.CallbackQuery):
+    """Кнопка «прислать файлом» под сообщением со ссылками: файл из MinIO загружается в чат."""
+    try:
+        file_id = int(callback.data.removeprefix(SEND_FILE_PREFIX))
+    except ValueError:
+        await callback.answer("❌ Некорректная кнопка.", show_alert=True)
+        return
+    row = get_report_file(file_id)
+    if row is None:
+        await callback.answer("❌ Файл больше не хранится.", show_alert=True)
+        return
+    if row["size"] and row["size"] > TELEGRAM_UPLOAD_LIMIT:
+        await callback.answer("⚠️ Файл больше 50 МБ — Telegram его не примет, скачайте по ссылке.", show_alert=True)
+        return
+
+    await callback.answer("⏳ Отправляю файл...")
+    try:
+        with Workspace("sendfile") as workspace:
+            report_file = await fetch_object(row["object_name"], row["filename"], workspace)
+            await callback.message.answer_document(document=report_file.as_input_file())
+    except MINIO_ERRORS as e:
+        logger.error(f"❌ Не удалось отправить файл {row['object_name']} по кнопке: {e}")
+        await callback.message.answer("❌ Не удалось получить файл, воспользуйтесь ссылкой.")
@@ -1,15 +1,18 @@
 # ✅ handlers/search.py
+import asyncio
 import os
 from aiogram import Router, F, types
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from aiogram.types.input_file import FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from datetime import datetime
 
-from db import list_user_companies, get_db
 from clients.interfax_client import interfax_client
 from keyboards.main import main_menu
+from services.jobs import CANCEL_PREFIX, Job, JobRejected, jobs
+from services.subscriptions import registry
+from services.report_store import get_report_files_for_event
+from utils.workspace import ReportFile, Workspace
 
 router = Router()
 
@@ -21,6 +24,8 @@ class SearchStates(StatesGroup):
     showing_results = State()
 
 
+DOWNLOAD_CONCURRENCY = 4  # одновременных скачиваний в пределах одной страницы
+
 CATEGORIES = [
     "бухгалтерская", "финансовая", "МСФО", "консолидированная", "годовая"
 ]
@@ -44,7 +49,7 @@ def years_keyboard() -> InlineKeyboardMarkup:
 
 @router.callback_query(F.data == "search_reports")
 async def search_start(callback: types.CallbackQuery, state: FSMContext):
-    companies = list_user_companies(callback.from_user.id)
+    companies = registry.list_companies(callback.from_user.id)
     if not companies:
         await callback.message.edit_text("❌ У вас нет сохранённых компаний.")
         return
@@ -85,34 +90,77 @@ async def show_results(callback: types.CallbackQuery, state: FSMContext):
     subject_code = data["subject_code"]
     category = data["category"]
 
-    await callback.message.edit_text("🔄 Поиск отчётов...")
+    # поиск и скачивания идут в фоне, хэндлер отвечает на callback сразу
+    await submit_job(callback, "search", lambda job: run_search(job, state, subject_code, category, year), state)
+
+
+@router.callback_query(SearchStates.showing_results, F.data == "show_more")
+async def show_more(callback: types.CallbackQuery, state: FSMContext):
+    await submit_job(callback, "search_page", lambda job: show_next_batch(job, state), state)
+
+
+@router.callback_query(F.data.startswith(CANCEL_PREFIX))
+async def cancel_search(callback: types.CallbackQuery, state: FSMContext):
+    # задача может выполняться в другой реплике — тогда её прервёт владелец
+    if not await jobs.cancel(int(callback.data.removeprefix(CANCEL_PREFIX)), callback.from_user.id):
+        await callback.answer("Запрос уже завершён.")
+        return
+
+    await callback.answer("⛔ Запрос отменён.")
+    await state.clear()
+    is_sub = registry.is_subscribed(callback.from_user.id)
+    await callback.message.answer("🏠 Возврат в главное меню.", reply_markup=main_menu(is_sub))
+
+
+async def submit_job(callback: types.CallbackQuery, kind: str, run, state: FSMContext):
+    async def back_to_menu(job: Job):
+        # после таймаута или ошибки — как при отмене: сброс FSM и главное меню
+        await state.clear()
+        is_sub = registry.is_subscribed(job.user_id)
+        await job.message.answer("🏠 Возврат в главное меню.", reply_markup=main_menu(is_sub))
+
+    try:
+        job = jobs.submit(callback.from_user.id, callback.message, kind, run, on_abort=back_to_menu)
+    except JobRejected as e:
+        await callback.answer(str(e), show_alert=True)
+        return
+
+    await callback.answer()
+    if job.started_at is None:  # все воркеры заняты
+        position = jobs.position(job)
+        await job.report(f"⏳ Запрос в очереди, перед вами: {position}" if position else "⏳ Запрос в очереди...",
+                         force=True)
+
+
+async def run_search(job: Job, state: FSMContext, subject_code: str, category: str, year: int):
+    await job.report("🔄 Поиск отчётов...", force=True)
 
     try:
         results = await interfax_client.search_reports_by_category(subject_code, category, year)
     except Exception as e:
-        await callback.message.edit_text(f"❌ Ошибка при поиске: {e}")
+        await job.finish(f"❌ Ошибка при поиске: {e}")
         await state.clear()
         return
 
     if not results:
-        await callback.message.edit_text("📭 Ничего не найдено по вашему запросу.")
-        with get_db() as conn:
-            res = conn.execute("SELECT is_subscribed FROM users WHERE user_id = ?", (callback.from_user.id,)).fetchone()
-            is_sub = bool(res["is_subscribed"]) if res else False
-        await callback.message.answer("🏠 Возврат в главное меню.", reply_markup=main_menu(is_sub))
+        await job.finish("📭 Ничего не найдено по вашему запросу.")
+        is_sub = registry.is_subscribed(job.user_id)
+        await job.message.answer("🏠 Возврат в главное меню.", reply_markup=main_menu(is_sub))
         await state.clear()
         return
 
     await state.update_data(results=results, offset=0)
-    await show_next_batch(callback.message, state)
+    await show_next_batch(job, state)
 
 
-async def show_next_batch(message: types.Message, state: FSMContext):
+async def show_next_batch(job: Job, state: FSMContext):
+    message = job.message
     data = await state.get_data()
     results = data.get("results", [])
     offset = data.get("offset", 0)
     batch = results[offset:offset + 10]
 
+    items = []
     seen = set()  # UID или publicUrl
     for r in batch:
         file = r.get("file", {})
@@ -131,26 +179,53 @@ async def show_next_batch(message: types.Message, state: FSMContext):
             f"🗓 Год: <b>{attrs.get('YearRep', 'не указано')}</b>\n"
             f"🗓 Дата публикации: <b>{attrs.get('DatePub', '-')}</b>"
         )
+        items.append((file, attrs, public_url, uid, caption))
 
+    # 📥 Скачиваем всю страницу параллельно, отправляем в исходном порядке
+    await job.report(f"⏳ Загружено 0 из {len(items)}...", force=True)
+    semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    completed = 0
+
+    async def download(uid: str, file: dict) -> list[ReportFile]:
+        nonlocal completed
         try:
-            paths = await interfax_client.download_and_extract_file(file)
-            if paths:
-                path = paths[0]
-                ext = os.path.splitext(path)[1]
-                name_part = file['type']['name'].replace(" ", "_")
-                year = attrs.get("YearRep", "год")
-                clean_filename = f"{name_part}_{year}_{uid or 'file'}{ext}"
-
-                doc = FSInputFile(path=path, filename=clean_filename)
-                await message.answer_document(document=doc, caption=caption, parse_mode="HTML")
-            else:
+            async with semaphore:
+                # уже сохранённые рассылкой отчёты берём из MinIO, остальные — со шлюза
+                return await get_report_files_for_event(interfax_client, uid, file, workspace, limit=1)
+        finally:
+            completed += 1
+            await job.report(f"⏳ Загружено {completed} из {len(items)}...", force=completed == len(items))
+
+    workspace = Workspace("search")
+    tasks = [asyncio.create_task(download(uid, file)) for file, _, _, uid, _ in items]
+
+    try:
+        for (file, attrs, public_url, uid, caption), task in zip(items, tasks):
+            try:
+                files = await task
+                if files:
+                    report_file = files[0]
+                    ext = os.path.splitext(report_file.filename)[1]
+                    name_part = file['type']['name'].replace(" ", "_")
+                    year = attrs.get("YearRep", "год")
+                    clean_filename = f"{name_part}_{year}_{uid or 'file'}{ext}"
+
+                    doc = report_file.as_input_file(filename=clean_filename)
+                    await message.answer_document(document=doc, caption=caption, parse_mode="HTML")
+                else:
+                    extra = f'\n🔗 <a href="{public_url}">Попробуйте открыть вручную</a>' if public_url else ''
+                    await message.answer(f"{caption}\n❌ Не удалось получить файл.{extra}", parse_mode="HTML")
+            except Exception as e:
                 extra = f'\n🔗 <a href="{public_url}">Попробуйте открыть вручную</a>' if public_url else ''
-                await message.answer(f"{caption}\n❌ Не удалось получить файл.{extra}", parse_mode="HTML")
-        except Exception as e:
-            extra = f'\n🔗 <a href="{public_url}">Попробуйте открыть вручную</a>' if public_url else ''
-            await message.answer(f"{caption}\n❌ Ошибка при скачивании: {e}{extra}", parse_mode="HTML")
+                await message.answer(f"{caption}\n❌ Ошибка при скачивании: {e}{extra}", parse_mode="HTML")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        workspace.cleanup()
 
     new_offset = offset + len(batch)
+    await job.finish(f"📄 Отчёты {offset + 1}–{new_offset} из {len(results)}")
     if new_offset < len(results):
         await state.update_data(offset=new_offset)
         await message.answer("⬇️ Показать ещё отчёты", reply_markup=InlineKeyboardMarkup(
@@ -158,15 +233,6 @@ async def show_next_batch(message: types.Message, state: FSMContext):
         ))
         await state.set_state(SearchStates.showing_results)
     else:
-        with get_db() as conn:
-            res = conn.execute("SELECT is_subscribed FROM users WHERE user_id = ?", (message.chat.id,)).fetchone()
-            is_sub = bool(res["is_subscribed"]) if res else False
+        is_sub = registry.is_subscribed(job.user_id)
         await message.answer("✅ Все результаты показаны.", reply_markup=main_menu(is_sub))
         await state.clear()
-
-
-
-@router.callback_query(SearchStates.showing_results, F.data == "show_more")
-async def show_more(callback: types.CallbackQuery, state: FSMContext):
-    await show_next_batch(callback.message, state)
-    await callback.answer()
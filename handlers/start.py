@@ -2,34 +2,14 @@ from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.types import CallbackQuery
 from keyboards.main import main_menu
-from db import get_db
+from services.subscriptions import registry
 
 router = Router()
 
 
-def is_user_subscribed(user_id: int) -> bool:
-    with get_db() as conn:
-        res = conn.execute(
-            "SELECT is_subscribed FROM users WHERE user_id = ?", (user_id,)
-        ).fetchone()
-        return bool(res["is_subscribed"]) if res else False
-
-
-def set_subscription(user_id: int, full_name: str, subscribed: bool):
-    with get_db() as conn:
-        conn.execute(
-            """
-            INSERT INTO users (user_id, full_name, is_subscribed)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET is_subscribed = excluded.is_subscribed
-        """,
-            (user_id, full_name, int(subscribed)),
-        )
-
-
 @router.message(Command("start"))
 async def start_cmd(message: types.Message):
-    is_sub = is_user_subscribed(message.from_user.id)
+    is_sub = registry.is_subscribed(message.from_user.id)
 
     text = (
         f"👋 Привет, {message.from_user.full_name}!\n\n"
@@ -47,7 +27,7 @@ async def toggle_subscription(callback: CallbackQuery):
     full_name = callback.from_user.full_name
     want_sub = callback.data == "subscribe"
 
-    set_subscription(user_id, full_name, want_sub)
+    registry.set_subscription(user_id, full_name, want_sub)
 
     text = (
         f"✅ Вы {'подписались на' if want_sub else 'отписались от'} рассылку отчётности.\n\n"
@@ -60,7 +40,7 @@ async def toggle_subscription(callback: CallbackQuery):
 
 @router.callback_query(lambda c: c.data == "about_bot")
 async def about_bot(callback: CallbackQuery):
-    is_sub = is_user_subscribed(callback.from_user.id)
+    is_sub = registry.is_subscribed(callback.from_user.id)
     await callback.message.edit_text(
         "ℹ️ <b>О боте</b>\n\n"
         "📊 Этот бот отслеживает публикации финансовой отчётности компаний через API Интерфакса.\n"
@@ -72,7 +52,7 @@ async def about_bot(callback: CallbackQuery):
 
 @router.callback_query(lambda c: c.data == "terms")
 async def terms(callback: CallbackQuery):
-    is_sub = is_user_subscribed(callback.from_user.id)
+    is_sub = registry.is_subscribed(callback.from_user.id)
     await callback.message.edit_text(
         "📄 <b>Пользовательское соглашение</b>\n\n"
         "Подписываясь на рассылку, вы соглашаетесь получать уведомления "
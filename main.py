@@ -4,34 +4,91 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import load_config
-from handlers import start, search, companies
+from handlers import start, search, companies, files
 from utils.logging import logger
+from utils.fsm_storage import SQLiteStorage
+from utils.metrics import TelegramMetricsMiddleware, start_metrics_server
+from utils.profiling import ProfilingMiddleware, profiler
+from utils.workspace import cleanup_orphans
 from db import init_db
 from services.scheduler import periodic_worker
 from services.dispatcher import process_events
+from services.sharding import ShardCoordinator
+from services.subscriptions import registry
+from services.issuers import issuers
+from services.retention import retention_worker
+from services.digest import digest, digest_worker
+from services.jobs import jobs
+from services.webhook import run_webhook
 from clients.interfax_client import interfax_client
 
+async def run_worker(bot: Bot, config):
+    """Роль worker: только опрос Интерфакса и рассылка по своей доле ИНН."""
+    shard = ShardCoordinator(config.worker.worker_id, config.worker.lease_seconds)
+    shard.heartbeat()
+    heartbeat = asyncio.create_task(shard.run_heartbeat())
+    logger.info(f"🛠 Воркер {shard.worker_id} запущен")
+
+    await interfax_client.init()
+    retention = asyncio.create_task(retention_worker(config.retention))
+    digests = asyncio.create_task(digest_worker(bot)) if digest.enabled else None
+    try:
+        await periodic_worker(bot, config.interval_minutes, shard=shard)
+    finally:
+        heartbeat.cancel()
+        retention.cancel()
+        if digests:
+            digests.cancel()
+        shard.shutdown()
+        await bot.session.close()
+
 async def main():
     init_db()
+    registry.load()
+    issuers.load()
+    # каждый subject из ответов шлюза пополняет справочник для поиска компаний без шлюза
+    interfax_client.on_subjects = issuers.observe
+    cleanup_orphans()
     config = load_config()
     bot = Bot(token=config.token, default=DefaultBotProperties(parse_mode="HTML"))
-    dp = Dispatcher(storage=MemoryStorage())
+    bot.session.middleware(TelegramMetricsMiddleware())
+
+    if config.metrics_port:
+        await start_metrics_server(config.metrics_port)
+
+    if config.worker.role == "worker":
+        await run_worker(bot, config)
+        return
+
+    storage = SQLiteStorage() if config.worker.fsm_storage == "sqlite" else MemoryStorage()
+    dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(ProfilingMiddleware(profiler))
 
     dp.include_router(start.router)
     dp.include_router(search.router)
     dp.include_router(companies.router)
+    dp.include_router(files.router)
+    jobs.start()
 
     logger.info("🚀 Bot is starting...")
-    await bot.delete_webhook(drop_pending_updates=True)
+    if config.update_mode != "webhook":
+        await bot.delete_webhook(drop_pending_updates=True)
 
-    # первая проверка
-    await interfax_client.init()
-    await process_events(bot, interfax_client)
+    if config.worker.role == "all":
+        # первая проверка
+        await interfax_client.init()
+        await process_events(bot, interfax_client)
 
-    # далее проверка по расписанию
-    asyncio.create_task(periodic_worker(bot, config.interval_minutes))
+        # далее проверка по расписанию
+        asyncio.create_task(periodic_worker(bot, config.interval_minutes))
+        asyncio.create_task(retention_worker(config.retention))
+        if digest.enabled:
+            asyncio.create_task(digest_worker(bot))
 
-    await dp.start_polling(bot)
+    if config.update_mode == "webhook":
+        await run_webhook(dp, bot, config.webhook)
+    else:
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,243 @@
+# bot/services/backfill.py
+"""
+Загрузка истории отчётов для списка эмитентов (подключение нового клиента):
+
+    python -m services.backfill --companies data/companies.json --from 2023-01-01 --to 2024-12-31
+
+Компании обходятся параллельно (--concurrency), запросы к шлюзу идут через общий лимитер
+InterfaxClient. Документы складываются в MinIO с дедупликацией по sha256 содержимого,
+события — в reports / report_files / processed_events. Прогресс сохраняется после каждой
+страницы событий в backfill_checkpoints, поэтому прерванный запуск с теми же датами
+продолжается с места остановки. Чекпоинт не уходит дальше первой страницы с ошибками, и
+компания с ошибками не отмечается загруженной: повторный запуск перепроверит эти страницы
+(уже сохранённые события пропускаются без скачивания). В конце печатается пропускная способность.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+
+from loguru import logger
+
+from db import (
+    find_object_by_sha256,
+    get_backfill_checkpoint,
+    get_report_by_uid,
+    init_db,
+    mark_event_as_processed,
+    save_backfill_checkpoint,
+    save_report,
+    save_report_file,
+)
+from utils.minio_client import object_url, upload_stream
+from utils.workspace import ReportFile, Workspace
+
+PAGE_SIZE = 100
+MAX_PAGES = 1000  # страниц на компанию за один запуск — защита от бесконечного обхода
+
+
+@dataclass
+class BackfillStats:
+    started: float = field(default_factory=time.perf_counter)
+    companies: int = 0
+    events: int = 0
+    skipped: int = 0  # уже были в базе (повторный запуск)
+    failed: int = 0
+    files: int = 0
+    deduplicated: int = 0
+    bytes_stored: int = 0
+    bytes_uploaded: int = 0
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        mb = self.bytes_stored / 1024 / 1024
+        return (
+            f"⏱ {elapsed:.1f} c | компаний: {self.companies}, событий: {self.events} "
+            f"({self.events / elapsed if elapsed else 0:.2f}/с), пропущено: {self.skipped}, ошибок: {self.failed}\n"
+            f"📄 файлов: {self.files}, дубликатов: {self.deduplicated}, "
+            f"{mb:.1f} МБ ({mb / elapsed if elapsed else 0:.2f} МБ/с), загружено в MinIO: "
+            f"{self.bytes_uploaded / 1024 / 1024:.1f} МБ"
+        )
+
+
+def load_companies(path: str) -> dict[str, str]:
+    """ИНН → название из JSON вида {"Название": "ИНН"} (как data/companies.json) или ["ИНН", ...]."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        return {str(inn): name for name, inn in data.items()}
+    return {str(inn): "" for inn in data}
+
+
+def _sha256(report_file: ReportFile) -> str:
+    digest = hashlib.sha256()
+    with report_file.open() as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _store_file(uid: str, report_file: ReportFile, stats: BackfillStats) -> str:
+    """Кладёт файл в MinIO, если такого содержимого там ещё нет. Возвращает имя объекта."""
+    sha256 = await asyncio.to_thread(_sha256, report_file)
+    object_name = find_object_by_sha256(sha256)
+    if object_name:
+        stats.deduplicated += 1
+    else:
+        object_name = f"{uid}/{report_file.filename}"
+
+        def upload():
+            with report_file.open() as stream:
+                upload_stream(stream, report_file.size, object_name)
+
+        await asyncio.to_thread(upload)
+        stats.bytes_uploaded += report_file.size
+    save_report_file(uid, report_file.filename, object_name, report_file.size, sha256)
+    stats.files += 1
+    stats.bytes_stored += report_file.size
+    return object_name
+
+
+async def store_event(interfax_client, event: dict, inn: str, company_name: str, stats: BackfillStats) -> bool:
+    """False — событие не сохранено, его нужно повторить при следующем запуске."""
+    uid = event["uid"]
+    if get_report_by_uid(uid):
+        stats.skipped += 1
+        return True
+
+    file_data = event["file"]
+    attrs = file_data.get("attributes", {})
+    company_name = company_name or (event.get("subject") or {}).get("shortName", "")
+    with Workspace("backfill") as workspace:
+        files = await interfax_client.download_and_extract_file(file_data, workspace)
+        if not files:
+            logger.warning(f"⚠️ История {inn}: не удалось получить файлы события {uid}")
+            stats.failed += 1
+            return False
+        object_names = [await _store_file(uid, report_file, stats) for report_file in files]
+
+    save_report(
+        event_uid=uid,
+        company_name=company_name,
+        inn=inn,
+        report_type=file_data.get("type", {}).get("name", "Отчёт"),
+        report_date=attrs.get("DatePub"),
+        description=file_data.get("description", "") or "Описание отсутствует",
+        document_url_in_minio=object_url(object_names[0]),
+    )
+    mark_event_as_processed(uid)
+    stats.events += 1
+    return True
+
+
+async def backfill_company(interfax_client, job: str, inn: str, company_name: str,
+                           date_from: date, date_to: date, stats: BackfillStats):
+    checkpoint = get_backfill_checkpoint(job, inn)
+    if checkpoint and checkpoint["done"]:
+        logger.info(f"⏭ {inn}: история за {job} уже загружена ({checkpoint['events']} событий)")
+        return
+    skip = checkpoint["next_skip"] if checkpoint else 0
+    events = checkpoint["events"] if checkpoint else 0
+    if skip:
+        logger.info(f"↩️ {inn}: продолжаю с события #{skip}")
+
+    retry_from = None  # первая страница с несохранёнными событиями
+    previous_uids: set[str] = set()
+    for _ in range(MAX_PAGES):
+        page, has_more = await interfax_client.get_events_page(inn, date_from, date_to, count=PAGE_SIZE, skip=skip)
+        uids = {event["uid"] for event in page}
+        if uids and uids <= previous_uids:
+            # шлюз проигнорировал skip и вернул ту же страницу — дальше листать бессмысленно,
+            # а чекпоинт не должен уходить за события, которых мы не видели
+            logger.error(f"❌ История {inn}: страница skip={skip} повторяет предыдущую, обход остановлен")
+            return
+        previous_uids = uids
+        stored = True
+        for event in page:
+            try:
+                stored = await store_event(interfax_client, event, inn, company_name, stats) and stored
+            except Exception as e:
+                logger.error(f"❌ История {inn}: ошибка сохранения события {event.get('uid')}: {e}")
+                stats.failed += 1
+                stored = False
+        if not stored and retry_from is None:
+            retry_from, retry_events = skip, events
+        skip += PAGE_SIZE
+        events += len(page)
+        if retry_from is None:
+            save_backfill_checkpoint(job, inn, skip, events, not has_more)
+        else:
+            save_backfill_checkpoint(job, inn, retry_from, retry_events, False)
+        if not has_more:
+            break
+    else:
+        logger.error(f"❌ История {inn}: за запуск пройдено {MAX_PAGES} страниц, следующий продолжит с #{skip}")
+        return
+
+    if retry_from is not None:
+        logger.warning(f"⚠️ {company_name or inn}: не все события сохранены, "
+                       f"следующий запуск повторит с события #{retry_from}")
+        return
+    stats.companies += 1
+    logger.success(f"✅ {company_name or inn}: история загружена, событий в периоде: {events}")
+
+
+async def run_backfill(interfax_client, companies: dict[str, str], date_from: date, date_to: date,
+                       concurrency: int) -> BackfillStats:
+    job = f"{date_from.isoformat()}:{date_to.isoformat()}"
+    stats = BackfillStats()
+    queue: asyncio.Queue = asyncio.Queue()
+    for inn, name in companies.items():
+        queue.put_nowait((inn, name))
+
+    async def worker():
+        while not queue.empty():
+            inn, name = queue.get_nowait()
+            try:
+                await backfill_company(interfax_client, job, inn, name, date_from, date_to, stats)
+            except Exception as e:
+                # компания не отмечена выполненной — следующий запуск продолжит с чекпоинта
+                logger.error(f"❌ История {inn}: {e}")
+
+    logger.info(f"📚 Загрузка истории {job}: компаний {len(companies)}, параллельно {concurrency}")
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return stats
+
+
+def parse_args(argv=None):
+    yesterday = date.today() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Загрузка истории отчётов эмитентов в MinIO и локальную базу")
+    parser.add_argument("--companies", help="JSON со списком компаний (формат data/companies.json)")
+    parser.add_argument("--inn", action="append", default=[], help="ИНН, можно указать несколько раз")
+    parser.add_argument("--from", dest="date_from", required=True, type=date.fromisoformat, help="YYYY-MM-DD")
+    # по умолчанию без сегодняшних событий: их разошлёт обычный опрос
+    parser.add_argument("--to", dest="date_to", default=yesterday, type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+    if not args.companies and not args.inn:
+        parser.error("нужен --companies или хотя бы один --inn")
+    return args
+
+
+async def main(args):
+    from clients.interfax_client import interfax_client
+    from services.issuers import issuers
+
+    init_db()
+    interfax_client.on_subjects = issuers.observe
+    companies = load_companies(args.companies) if args.companies else {}
+    companies.update({inn: companies.get(inn, "") for inn in args.inn})
+
+    await interfax_client.init()
+    try:
+        stats = await run_backfill(interfax_client, companies, args.date_from, args.date_to, args.concurrency)
+    finally:
+        await interfax_client.close()
+    logger.info(f"📊 Итог загрузки истории:\n{stats.summary()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,90 @@
+# bot/services/delivery.py
+"""
+Доставка ссылками: крупные файлы (больше LINK_DELIVERY_MB) и события с числом файлов
+больше LINK_DELIVERY_MAX_FILES не загружаются в Telegram — подписчик получает сообщение
+с временными (presigned) ссылками на MinIO и, опционально, кнопками «прислать файлом».
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+from html import escape
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from loguru import logger
+
+from config import DeliveryConfig, load_config
+from utils.metrics import LINK_DELIVERIES
+from utils.minio_client import presigned_url
+
+MB = 1024 * 1024
+TELEGRAM_UPLOAD_LIMIT = 50 * MB  # больше Bot API файл не примет
+MESSAGE_LIMIT = 4096
+SEND_FILE_PREFIX = "sendfile_"
+
+
+@dataclass
+class LinkedFile:
+    file_id: int  # id в report_files, по нему кнопка «прислать файлом» находит объект
+    filename: str
+    object_name: str
+    size: int
+
+
+def _format_size(size: int) -> str:
+    return f"{size / MB:.1f} МБ" if size >= MB else f"{size / 1024:.0f} КБ"
+
+
+class LinkDelivery:
+    def __init__(self, config: DeliveryConfig):
+        self.config = config
+
+    @property
+    def size_threshold(self) -> int:
+        if not self.config.link_threshold_mb:
+            return TELEGRAM_UPLOAD_LIMIT
+        return min(self.config.link_threshold_mb * MB, TELEGRAM_UPLOAD_LIMIT)
+
+    def needs_link(self, size: int, files_in_event: int) -> bool:
+        max_files = self.config.link_max_files
+        return size > self.size_threshold or bool(max_files and files_in_event > max_files)
+
+    def render(self, caption: str, files: list[LinkedFile]) -> list[tuple[str, InlineKeyboardMarkup]]:
+        """Сообщения со ссылками; длинные списки делятся по лимиту длины сообщения."""
+        hours = self.config.link_expiry_hours
+        expires = timedelta(hours=hours)
+        header = f"{caption}\n\n📦 Файлы по ссылкам (действуют {hours} ч):"
+        messages = []
+        text, buttons = header, []
+        for linked in files:
+            line = (f'\n🔗 <a href="{escape(presigned_url(linked.object_name, expires))}">'
+                    f'{escape(linked.filename)}</a> ({_format_size(linked.size)})')
+            if len(text) + len(line) > MESSAGE_LIMIT and text != header:
+                messages.append((text, buttons))
+                text, buttons = "📦 Продолжение:", []
+            text += line
+            if self.config.send_file_button and linked.size <= TELEGRAM_UPLOAD_LIMIT:
+                buttons.append([InlineKeyboardButton(
+                    text=f"📥 {linked.filename}"[:64], callback_data=f"{SEND_FILE_PREFIX}{linked.file_id}"
+                )])
+        messages.append((text, buttons))
+        return [(text, InlineKeyboardMarkup(inline_keyboard=buttons) if buttons else None) for text, buttons in messages]
+
+    async def send(self, bot: Bot, user_ids: list[int], caption: str, files: list[LinkedFile]) -> int:
+        """Возвращает число пользователей, получивших ссылки."""
+        # ссылки подписываются один раз на всех подписчиков события
+        messages = self.render(caption, files)
+        delivered = 0
+        for user_id in user_ids:
+            try:
+                for text, keyboard in messages:
+                    await bot.send_message(chat_id=user_id, text=text, reply_markup=keyboard,
+                                           parse_mode="HTML", disable_web_page_preview=True)
+                LINK_DELIVERIES.inc(len(files))
+                delivered += 1
+                logger.success(f"🔗 Ссылки на {len(files)} файл(ов) отправлены пользователю {user_id}.")
+            except Exception as e:
+                logger.error(f"❌ Не удалось отправить ссылки пользователю {user_id}: {e}")
+        return delivered
+
+
+link_delivery = LinkDelivery(load_config().delivery)
@@ -0,0 +1,145 @@
+# bot/services/digest.py
+"""
+Дайджест: вместо send_document на каждый документ новые отчёты пользователя копятся
+в digest_queue в течение DIGEST_WINDOW_MINUTES и уходят альбомами send_media_group
+(до 10 документов за вызов) с одной сводной подписью.
+Файлы к моменту постановки в очередь уже загружены в MinIO, при отправке читаются оттуда.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import InputMediaDocument
+from loguru import logger
+from minio.error import S3Error
+
+from config import DigestConfig, load_config
+from db import claim_digest, enqueue_digest, list_due_digest_users, requeue_digest
+from services.report_store import fetch_object
+from utils.metrics import PUBLISH_TO_DELIVERY, TELEGRAM_DIGEST_DOCUMENTS
+from utils.tracing import get_tracer
+from utils.workspace import ReportFile, Workspace
+
+tracer = get_tracer(__name__)
+
+MEDIA_GROUP_SIZE = 10  # ограничение Bot API на альбом
+CAPTION_LIMIT = 1024
+MAX_ATTEMPTS = 3
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def build_summary(items: list[dict]) -> str:
+    """Сводная подпись: одна строка на событие, при превышении лимита подписи — «и ещё N»."""
+    lines = {}
+    for item in items:
+        lines.setdefault(item["event_uid"], item["summary"])
+
+    header = f"📬 <b>Новые отчёты: {len(lines)}</b>"
+    caption = header
+    for shown, line in enumerate(lines.values()):
+        tail = f"\n… и ещё {len(lines) - shown}"
+        if len(caption) + len(line) + 1 + len(tail) > CAPTION_LIMIT:
+            return caption + tail
+        caption += "\n" + line
+    return caption
+
+
+class DigestQueue:
+    def __init__(self, config: DigestConfig):
+        self.config = config
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.window_minutes > 0
+
+    def enqueue(self, user_ids: list[int], event_uid: str, filename: str, object_name: str,
+                summary: str, published_at: Optional[float] = None):
+        enqueue_digest(user_ids, event_uid, filename, object_name, summary, published_at)
+
+    async def flush_due(self, bot: Bot, window_seconds: Optional[int] = None) -> int:
+        """Отправляет дайджесты пользователей, чьё окно истекло. Возвращает число вызовов Bot API."""
+        if window_seconds is None:
+            window_seconds = self.config.window_minutes * 60
+        users = await asyncio.to_thread(list_due_digest_users, window_seconds)
+        calls = 0
+        for user_id in users:
+            items = await asyncio.to_thread(claim_digest, user_id)
+            if items:
+                calls += await self._send(bot, user_id, items)
+        return calls
+
+    async def _send(self, bot: Bot, user_id: int, items: list[dict]) -> int:
+        calls = 0
+        pending = list(items)  # ещё не доставленные — при ошибке возвращаются в очередь
+        with tracer.start_as_current_span("digest.flush", attributes={
+            "user_id": user_id, "documents": len(items),
+        }) as span, Workspace("digest") as workspace:
+            try:
+                files = await self._fetch(items, workspace)
+                groups = _chunks(files, MEDIA_GROUP_SIZE)
+                summary = build_summary([item for item, _ in files])
+                for number, group in enumerate(groups, start=1):
+                    # подпись — у последнего документа последнего альбома, внизу дайджеста
+                    captions = [None] * len(group)
+                    if number == len(groups):
+                        captions[-1] = summary
+                    if len(group) == 1:
+                        await bot.send_document(chat_id=user_id, document=group[0][1].as_input_file(),
+                                                caption=captions[0], parse_mode="HTML")
+                    else:
+                        await bot.send_media_group(chat_id=user_id, media=[
+                            InputMediaDocument(media=report_file.as_input_file(), caption=caption, parse_mode="HTML")
+                            for (_, report_file), caption in zip(group, captions)
+                        ])
+                    calls += 1
+                    sent = [item for item, _ in group]
+                    pending = [item for item in pending if item not in sent]
+                    TELEGRAM_DIGEST_DOCUMENTS.inc(len(sent))
+                    self._observe_delivery(sent)
+                logger.success(f"📬 Дайджест пользователю {user_id}: {len(files)} док., вызовов Bot API: {calls}")
+            except Exception as e:
+                logger.error(f"❌ Не удалось отправить дайджест пользователю {user_id}: {e}")
+                span.record_exception(e)
+            finally:
+                span.set_attribute("telegram.calls", calls)
+                if pending:
+                    await asyncio.to_thread(self._retry, user_id, pending)
+        return calls
+
+    async def _fetch(self, items: list[dict], workspace: Workspace) -> list[tuple[dict, ReportFile]]:
+        files = []
+        for item in items:
+            try:
+                files.append((item, await fetch_object(item["object_name"], item["filename"], workspace)))
+            except (S3Error, OSError) as e:
+                logger.error(f"❌ Файл {item['object_name']} не получен из MinIO для дайджеста: {e}")
+        return files
+
+    def _retry(self, user_id: int, items: list[dict]):
+        retry = [item for item in items if item["attempts"] + 1 < MAX_ATTEMPTS]
+        if len(retry) < len(items):
+            logger.error(f"❌ Дайджест пользователю {user_id}: {len(items) - len(retry)} док. отброшено после {MAX_ATTEMPTS} попыток")
+        if retry:
+            requeue_digest(retry)
+
+    @staticmethod
+    def _observe_delivery(items: list[dict]):
+        published = {item["event_uid"]: item["published_at"] for item in items if item["published_at"]}
+        for published_at in published.values():
+            PUBLISH_TO_DELIVERY.observe(max(time.time() - published_at, 0))
+
+
+async def digest_worker(bot: Bot):
+    while True:
+        try:
+            await digest.flush_due(bot)
+        except Exception as e:
+            logger.error(f"❌ Ошибка отправки дайджестов: {e}")
+        await asyncio.sleep(digest.config.flush_interval_seconds)
+
+
+digest = DigestQueue(load_config().digest)
@@ -1,110 +1,245 @@
 # ✅ dispatcher.py
 
-import os
-from datetime import datetime
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from aiogram import Bot
-from aiogram.types import FSInputFile
 from loguru import logger
 
 from clients.interfax_client import interfax_client
 from db import (
-    get_db,
     mark_event_as_processed,
     save_report,
+    save_report_file,
 )
-from utils.minio_client import upload_file
-from utils.cleaner import remove_temp_files
+from services.delivery import LinkedFile, link_delivery
+from services.digest import digest
+from services.subscriptions import registry
+from utils.minio_client import upload_stream
+from utils.metrics import CYCLE_DURATION, CYCLE_EVENTS, EVENTS_PROCESSED, PUBLISH_TO_DELIVERY
+from utils.profiling import profiler
+from utils.resilience import gateway
+from utils.tracing import StatusCode, get_tracer, trace_id_for
+from utils.workspace import Workspace
+
+tracer = get_tracer(__name__)
+
+# поля события с моментом публикации на шлюзе (DatePub содержит только дату)
+PUBLISH_TIME_FIELDS = ("publishDate", "publicationDate", "date")
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+
+def _published_at(event: dict) -> Optional[datetime]:
+    """Момент публикации события; время без часового пояса считается московским."""
+    for source in (event, event.get("file") or {}):
+        for field in PUBLISH_TIME_FIELDS:
+            value = source.get(field)
+            if not isinstance(value, str):
+                continue
+            try:
+                published = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            return published if published.tzinfo else published.replace(tzinfo=MOSCOW_TZ)
+    return None
+
 
+async def process_events(bot: Bot, interfax_client, shard=None):
+    async with profiler.profile("cycle", enabled=profiler.should_profile_cycle()):
+        with tracer.start_as_current_span("dispatch.cycle", attributes={"shard": shard.worker_id if shard else ""}):
+            await _process_events(bot, interfax_client, shard)
 
-async def process_events(bot: Bot, interfax_client):
+
+async def _process_events(bot: Bot, interfax_client, shard=None):
     logger.info("🔁 Начинаю проверку новых событий через Интерфакс...")
+    started = time.perf_counter()
+    events_count = 0
 
-    with get_db() as conn:
-        rows = conn.execute("""
-            SELECT u.user_id, u.full_name, c.company_name, c.inn
-            FROM users u
-            JOIN user_companies c ON u.user_id = c.user_id
-            WHERE u.is_subscribed = 1
-        """).fetchall()
+    with profiler.slow_op("load_subscriptions"):
+        subscriptions = registry.subscriptions()
 
-    user_companies = {}
-    for row in rows:
-        user_companies.setdefault((row["user_id"], row["full_name"]), []).append((row["company_name"], row["inn"]))
+    # по одному опрашивающему на аккаунт Интерфакса: с пулом аккаунтов цикл ускоряется пропорционально
+    companies = iter(subscriptions.items())
 
-    for (user_id, full_name), companies in user_companies.items():
-        for company_name, inn in companies:
-            logger.info(f"🔍 [{user_id}] {full_name} — {company_name} (ИНН: {inn})")
+    async def poller():
+        nonlocal events_count
+        for inn, (company_name, users) in companies:
+            # шлюз недоступен — не ждём таймаутов по каждой компании, следующий цикл начнёт заново
+            if gateway.breaker.is_open:
+                logger.warning("⚡️ Шлюз Интерфакса недоступен (circuit breaker открыт) — цикл прерван")
+                break
 
-            try:
-                file_events = await interfax_client.get_file_events(subject_code=inn)
-            except Exception as e:
-                logger.error(f"❌ Ошибка при получении отчётов для {company_name}: {e}")
+            # в режиме нескольких воркеров каждый опрашивает только свои ИНН
+            if shard is not None and not shard.claim(inn):
                 continue
 
-            for event in file_events:
-                uid = event["uid"]
-                file_data = event.get("file", {})
-                attrs = file_data.get("attributes", {})
-                public_url = file_data.get("publicUrl")
-
-                pub_date = attrs.get("DatePub")
-                if not pub_date or datetime.strptime(pub_date, "%d.%m.%Y").date() != datetime.utcnow().date():
+            try:
+                with profiler.slow_op("process_company", inn=inn, subscribers=len(users)):
+                    found = await process_company(bot, interfax_client, inn, company_name, users)
+                events_count += found
+            finally:
+                if shard is not None:
+                    shard.release(inn)
+
+    await asyncio.gather(*(poller() for _ in range(max(len(interfax_client.accounts), 1))))
+
+    CYCLE_DURATION.observe(time.perf_counter() - started)
+    CYCLE_EVENTS.set(events_count)
+    logger.info(f"✅ Фоновая проверка завершена. Новых событий: {events_count}")
+
+
+async def process_company(bot: Bot, interfax_client, inn: str, company_name: str, users: list[tuple[int, str]]) -> int:
+    """Обрабатывает новые события одной компании. Возвращает число событий за сегодня."""
+    logger.info(f"🔍 {company_name} (ИНН: {inn}) — подписчиков: {len(users)}")
+
+    try:
+        with profiler.slow_op("get_file_events", inn=inn), \
+                tracer.start_as_current_span("poll", attributes={"company.inn": inn}) as poll_span:
+            file_events = await interfax_client.get_file_events(subject_code=inn)
+            poll_span.set_attribute("events", len(file_events))
+    except Exception as e:
+        logger.error(f"❌ Ошибка при получении отчётов для {company_name}: {e}")
+        return 0
+
+    events_count = 0
+    for event in file_events:
+        uid = event["uid"]
+        file_data = event.get("file", {})
+        attrs = file_data.get("attributes", {})
+
+        pub_date = attrs.get("DatePub")
+        if not pub_date or datetime.strptime(pub_date, "%d.%m.%Y").date() != datetime.utcnow().date():
+            continue
+
+        events_count += 1
+        report_type = file_data.get("type", {}).get("name", "Отчёт")
+        description = file_data.get("description", "") or "Описание отсутствует"
+
+        workspace = Workspace("dispatch")
+        published_at = _published_at(event)
+        delivered = False
+        # трасса события: все стадии от опроса до send_document под одним traceId
+        with tracer.start_as_current_span("event", trace_id=trace_id_for(uid), attributes={
+            "event.uid": uid,
+            "company.inn": inn,
+            "report.type": report_type,
+            "subscribers": len(users),
+            "poll.trace_id": poll_span.trace_id,
+        }) as span:
+            if published_at:
+                span.set_attribute("event.published_at", published_at.isoformat())
+                span.set_attribute("event.poll_lag_s", round(time.time() - published_at.timestamp(), 3))
+            try:
+                # 🔽 Скачиваем и распаковываем
+                with profiler.slow_op("download_and_extract_file", inn=inn, uid=uid):
+                    files = await interfax_client.download_and_extract_file(file_data, workspace)
+                span.set_attribute("files", len(files))
+                if not files:
+                    logger.warning(f"⚠️ Не удалось извлечь файл(ы) для события {uid}")
+                    EVENTS_PROCESSED.inc(result="no_files")
+                    span.set_attribute("result", "no_files")
                     continue
 
-                report_type = file_data.get("type", {}).get("name", "Отчёт")
-                description = file_data.get("description", "") or "Описание отсутствует"
+                caption = (
+                    f"🏢 <b>{company_name}</b>\n"
+                    f"📄 Тип: <b>{report_type}</b>\n"
+                    f"🗓 Год: <b>{attrs.get('YearRep', 'не указано')}</b>\n"
+                    f"🗓 Дата публикации: <b>{pub_date}</b>\n"
+                    f"📜 {description}"
+                )
+                linked = []  # файлы, которые уйдут ссылками на MinIO
+
+                for idx, report_file in enumerate(files):
+                    filename = report_file.filename
+
+                    # ⬆️ Загрузка в MinIO потоком, под префиксом события — имена членов архивов повторяются
+                    object_name = f"{uid}/{filename}"
+                    with profiler.slow_op("upload_file", uid=uid, filename=filename, size=report_file.size), \
+                            tracer.start_as_current_span("minio.upload", attributes={
+                                "object": object_name, "bytes": report_file.size,
+                            }), \
+                            report_file.open() as stream:
+                        minio_url = await asyncio.to_thread(upload_stream, stream, report_file.size, object_name)
+                    file_id = save_report_file(uid, filename, object_name, report_file.size)
+
+                    # 💾 В БД только один раз
+                    if idx == 0:
+                        save_report(
+                            event_uid=uid,
+                            company_name=company_name,
+                            inn=inn,
+                            report_type=report_type,
+                            report_date=pub_date,
+                            description=description,
+                            document_url_in_minio=minio_url
+                        )
+                        mark_event_as_processed(uid)
 
-                try:
-                    # 🔽 Скачиваем и распаковываем
-                    paths = await interfax_client.download_and_extract_file(file_data)
-                    if not paths:
-                        logger.warning(f"⚠️ Не удалось извлечь файл(ы) для события {uid}")
+                    # 🔗 Крупные файлы и события с большим числом файлов — ссылками
+                    if link_delivery.needs_link(report_file.size, len(files)):
+                        linked.append(LinkedFile(file_id, filename, object_name, report_file.size))
                         continue
 
-                    for idx, file_path in enumerate(paths):
-                        filename = os.path.basename(file_path)
-                        with open(file_path, "rb") as f:
-                            file_bytes = f.read()
-
-                        # ⬆️ Загрузка в MinIO
-                        minio_url = upload_file(file_bytes, filename)
-
-                        # 💾 В БД только один раз
-                        if idx == 0:
-                            save_report(
-                                event_uid=uid,
-                                company_name=company_name,
-                                inn=inn,
-                                report_type=report_type,
-                                report_date=pub_date,
-                                description=description,
-                                document_url_in_minio=minio_url
-                            )
-                            mark_event_as_processed(uid)
-
-                        # 📤 Отправка пользователю
-                        caption = (
-                            f"🏢 <b>{company_name}</b>\n"
-                            f"📄 Тип: <b>{report_type}</b>\n"
-                            f"🗓 Год: <b>{attrs.get('YearRep', 'не указано')}</b>\n"
-                            f"🗓 Дата публикации: <b>{pub_date}</b>\n"
-                            f"📜 {description}"
-                        )
-
-                        doc = FSInputFile(path=file_path)
-                        await bot.send_document(
-                            chat_id=user_id,
-                            document=doc,
-                            caption=caption,
-                            parse_mode="HTML"
+                    # 📬 В режиме дайджеста документ ждёт в очереди и уходит альбомом
+                    if digest.enabled:
+                        digest.enqueue(
+                            [user_id for user_id, _ in users], uid, filename, object_name,
+                            summary=f"🏢 <b>{company_name}</b> — {report_type} ({pub_date})",
+                            published_at=published_at.timestamp() if published_at else None,
                         )
-                        logger.success(f"📤 Файл {filename} отправлен пользователю {user_id}.")
-
-                except Exception as e:
-                    logger.error(f"❌ Ошибка при обработке отчёта {uid} для {company_name}: {e}")
-                finally:
-                    if 'paths' in locals() and paths:
-                        remove_temp_files(paths + [os.path.dirname(paths[0])])
+                        span.add_event("digest_enqueued", {"filename": filename})
+                        continue
 
-    logger.info("✅ Фоновая проверка завершена.")
+                    # 📤 Отправка подписчикам
+                    for user_id, _ in users:
+                        try:
+                            doc = report_file.as_input_file()
+                            with profiler.slow_op("send_document", uid=uid, user_id=user_id, filename=filename), \
+                                    tracer.start_as_current_span("telegram.send_document", attributes={
+                                        "user_id": user_id, "filename": filename, "bytes": report_file.size,
+                                    }):
+                                await bot.send_document(
+                                    chat_id=user_id,
+                                    document=doc,
+                                    caption=caption,
+                                    parse_mode="HTML"
+                                )
+                            logger.success(f"📤 Файл {filename} отправлен пользователю {user_id}.")
+                            if not delivered:
+                                delivered = True
+                                _observe_delivery(span, published_at)
+                        except Exception as e:
+                            logger.error(f"❌ Не удалось отправить {filename} пользователю {user_id}: {e}")
+
+                if linked:
+                    with tracer.start_as_current_span("telegram.send_links", attributes={
+                        "files": len(linked), "bytes": sum(f.size for f in linked),
+                    }):
+                        sent = await link_delivery.send(bot, [user_id for user_id, _ in users], caption, linked)
+                    if sent and not delivered:
+                        delivered = True
+                        _observe_delivery(span, published_at)
+
+                EVENTS_PROCESSED.inc(result="ok")
+                span.set_attribute("result", "ok")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при обработке отчёта {uid} для {company_name}: {e}")
+                EVENTS_PROCESSED.inc(result="error")
+                span.record_exception(e)
+                span.set_status(StatusCode.ERROR, str(e))
+            finally:
+                workspace.cleanup()
+
+    return events_count
+
+
+def _observe_delivery(span, published_at: Optional[datetime]):
+    """Первая успешная доставка события: задержка от публикации на шлюзе."""
+    span.add_event("first_delivery")
+    if published_at is None:
+        return
+    lag = time.time() - published_at.timestamp()
+    span.set_attribute("event.publish_to_delivery_s", round(lag, 3))
+    PUBLISH_TO_DELIVERY.observe(max(lag, 0))
@@ -0,0 +1,195 @@
+# bot/services/issuers.py
+
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+from loguru import logger
+
+import db
+from utils.metrics import ISSUER_DIRECTORY_SIZE, ISSUER_SEARCH_LATENCY
+
+_WORD_RE = re.compile(r"[0-9a-zа-я]+")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё → е, без кавычек и знаков препинания: «ПАО "Сбербанк"» → «пао сбербанк»."""
+    return " ".join(_WORD_RE.findall((text or "").lower().replace("ё", "е")))
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IssuerDirectory:
+    """
+    Справочник эмитентов в памяти процесса: ИНН, ОГРН и названия всех subject, которые видели
+    опрос, поиск и загрузка истории. Хранится в таблице issuers, ищется без запросов к шлюзу:
+    цифры — по префиксу ИНН/ОГРН (бинарный поиск по отсортированным кодам), текст — по
+    триграммному индексу названий (подстрока, а при опечатках — по доле совпавших триграмм).
+    Записи других процессов подхватываются по updated_at не чаще раза в REFRESH_INTERVAL.
+    """
+
+    REFRESH_INTERVAL = 30.0
+    MIN_QUERY_LENGTH = 2
+    FUZZY_THRESHOLD = 0.5  # доля триграмм запроса, которые должны найтись в названии
+    MAX_CANDIDATES = 5000
+    MAX_FUZZY_POSTING = 20000  # триграммы чаще этого не учитываются при поиске с опечатками
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._updated_at = 0.0
+        self._checked_at = 0.0
+        self._issuers: dict[str, dict] = {}
+        self._names: dict[str, str] = {}  # ИНН → нормализованные названия (краткое + полное)
+        self._trigram_index: dict[str, set[str]] = {}
+        self._codes: list[tuple[str, str]] = []  # (ИНН или ОГРН, ИНН), отсортировано
+
+    def load(self):
+        self._apply(db.load_issuers())
+        self._loaded = True
+        logger.info(f"🏛 Справочник эмитентов загружен: {len(self._issuers)}")
+
+    def refresh(self):
+        if not self._loaded:
+            self.load()
+            return
+        if time.monotonic() - self._checked_at < self.REFRESH_INTERVAL:
+            return
+        # перекрытие в секунду — на случай записей, закоммиченных чуть позже своего updated_at
+        self._apply(db.load_issuers(self._updated_at - 1))
+
+    def _apply(self, rows: list[dict]):
+        with self._lock:
+            for row in rows:
+                self._index(row)
+                self._updated_at = max(self._updated_at, row["updated_at"])
+            self._checked_at = time.monotonic()
+        ISSUER_DIRECTORY_SIZE.set(len(self._issuers))
+
+    def _index(self, issuer: dict):
+        inn = issuer["inn"]
+        previous = self._issuers.get(inn)
+        if previous:
+            for gram in _trigrams(f" {self._names[inn]} "):
+                postings = self._trigram_index.get(gram)
+                if postings:
+                    postings.discard(inn)
+        else:
+            bisect.insort(self._codes, (inn, inn))
+        if issuer.get("ogrn") and (not previous or previous.get("ogrn") != issuer["ogrn"]):
+            if previous and previous.get("ogrn"):
+                # прежний ОГРН больше не должен находить эмитента
+                stale = bisect.bisect_left(self._codes, (previous["ogrn"], inn))
+                if stale < len(self._codes) and self._codes[stale] == (previous["ogrn"], inn):
+                    del self._codes[stale]
+            bisect.insort(self._codes, (issuer["ogrn"], inn))
+
+        self._issuers[inn] = {key: issuer.get(key) for key in ("inn", "ogrn", "short_name", "full_name")}
+        names = " ".join(dict.fromkeys(normalize(issuer.get(key)) for key in ("short_name", "full_name")))
+        self._names[inn] = names.strip()
+        for gram in _trigrams(f" {self._names[inn]} "):
+            self._trigram_index.setdefault(gram, set()).add(inn)
+
+    # --- наполнение ---
+
+    def observe(self, subjects: Iterable[Optional[dict]]):
+        """subject из событий шлюза (shortName, fullName, inn, ogrn); в базу пишутся только новые и изменённые."""
+        self.refresh()
+        changed = []
+        for subject in subjects:
+            if not subject or not subject.get("inn"):
+                continue
+            issuer = {
+                "inn": str(subject["inn"]),
+                "ogrn": str(subject["ogrn"]) if subject.get("ogrn") else None,
+                "short_name": subject.get("shortName"),
+                "full_name": subject.get("fullName"),
+            }
+            known = self._issuers.get(issuer["inn"])
+            if known and all(known.get(key) == value for key, value in issuer.items() if value):
+                continue
+            changed.append(issuer)
+        if not changed:
+            return
+
+        unique = list({issuer["inn"]: issuer for issuer in changed}.values())
+        db.upsert_issuers(unique)
+        with self._lock:
+            for issuer in unique:
+                known = self._issuers.get(issuer["inn"], {})
+                self._index({key: value or known.get(key) for key, value in issuer.items()})
+        ISSUER_DIRECTORY_SIZE.set(len(self._issuers))
+
+    # --- поиск ---
+
+    def get(self, code: str) -> Optional[dict]:
+        """Эмитент по точному ИНН или ОГРН."""
+        self.refresh()
+        if code in self._issuers:
+            return dict(self._issuers[code])
+        matches = self._by_code_prefix(code, limit=1)
+        return matches[0] if matches and code in (matches[0]["inn"], matches[0]["ogrn"]) else None
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Эмитенты по префиксу ИНН/ОГРН или по части названия, лучшие совпадения первыми."""
+        self.refresh()
+        with ISSUER_SEARCH_LATENCY.time():
+            query = query.strip()
+            if query.isdigit():
+                return self._by_code_prefix(query, limit)
+            text = normalize(query)
+            if len(text) < self.MIN_QUERY_LENGTH:
+                return []
+            with self._lock:
+                return self._by_name(text, limit)
+
+    def _by_code_prefix(self, prefix: str, limit: int) -> list[dict]:
+        with self._lock:
+            found = []
+            for code, inn in self._codes[bisect.bisect_left(self._codes, (prefix, "")):]:
+                if not code.startswith(prefix) or len(found) >= limit:
+                    break
+                if inn not in found:
+                    found.append(inn)
+            return [dict(self._issuers[inn]) for inn in found]
+
+    def _by_name(self, text: str, limit: int) -> list[dict]:
+        # пробел в начале — триграммы начала слова; в конце нет: пользователь ещё дописывает слово
+        grams = _trigrams(f" {text}")
+        postings = sorted((self._trigram_index.get(gram, set()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            candidates = ()
+        elif len(postings[0]) > self.MAX_CANDIDATES:
+            # «пао», «публичное» есть почти в каждом названии: пересекать и ранжировать десятки
+            # тысяч кандидатов дорого, а полезных среди них не больше, чем в первых MAX_CANDIDATES
+            candidates = itertools.islice(postings[0], self.MAX_CANDIDATES)
+        else:
+            candidates = set.intersection(*postings)
+
+        def rank(inn: str) -> tuple:
+            names = self._names[inn]
+            return (not names.startswith(text), f" {text}" not in f" {names}", len(names), inn)
+
+        found = heapq.nsmallest(limit, (inn for inn in candidates if text in self._names[inn]), key=rank)
+        if len(found) < limit:
+            # опечатки: по доле совпавших триграмм; слишком частые триграммы ничего не различают
+            useful = [posting for posting in postings if len(posting) <= self.MAX_FUZZY_POSTING]
+            hits = Counter(inn for posting in useful for inn in posting)
+            needed = max(1, int(len(grams) * self.FUZZY_THRESHOLD + 0.5))
+            seen = set(found)
+            found += heapq.nsmallest(
+                limit - len(found),
+                (inn for inn, count in hits.items() if count >= needed and inn not in seen),
+                key=lambda inn: (-hits[inn], len(self._names[inn]), inn),
+            )
+        return [dict(self._issuers[inn]) for inn in found]
+
+
+issuers = IssuerDirectory()
@@ -0,0 +1,221 @@
+# bot/services/jobs.py
+"""
+Фоновые задачи интерактивных хэндлеров (поиск отчётов и скачивание страницы результатов).
+
+Хэндлер только ставит задачу в очередь и сразу отвечает на callback — «часики» у кнопки
+не висят, а обработка апдейтов не ждёт шлюз и скачивания. Задачи выполняют JOBS_WORKERS
+фоновых воркеров; в очереди не больше JOBS_QUEUE_SIZE задач, у одного пользователя — не больше
+JOBS_PER_USER одновременно. Прогресс показывается правкой сообщения задачи, под ним кнопка
+отмены; задача дольше JOBS_TIMEOUT_SECONDS прерывается.
+
+Задачи регистрируются в таблице jobs общей базы: лимит на пользователя считается по всем
+репликам бота, а отмена, пришедшая в другую реплику, помечает задачу в базе — реплика-владелец
+видит отметку при очередном продлении (раз в HEARTBEAT_INTERVAL) и прерывает задачу.
+Записи упавших реплик перестают учитываться через LEASE_SECONDS.
+"""
+import asyncio
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from loguru import logger
+
+import db
+from config import JobsConfig, load_config
+from utils.metrics import JOB_DURATION, JOB_QUEUE_WAIT, JOBS_ACTIVE, JOBS_QUEUED, JOBS_TOTAL
+
+CANCEL_PREFIX = "jobcancel_"
+PROGRESS_INTERVAL = 1.0  # не чаще одной правки сообщения в секунду — лимиты Bot API
+HEARTBEAT_INTERVAL = 1.0  # как быстро реплика замечает отмену из другой реплики
+LEASE_SECONDS = 30
+
+
+class JobRejected(Exception):
+    """Задача не принята: у пользователя уже есть задачи или очередь заполнена."""
+
+
+@dataclass
+class Job:
+    id: int
+    user_id: int
+    kind: str
+    message: types.Message  # сообщение, в котором показывается прогресс
+    run: Callable[["Job"], Awaitable[None]]
+    # после таймаута или ошибки — вернуть пользователя в исходное состояние (FSM, меню)
+    on_abort: Optional[Callable[["Job"], Awaitable[None]]] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    cancelled: bool = False
+    task: Optional[asyncio.Task] = None
+    _reported_at: float = 0.0
+    _text: str = ""
+
+    @property
+    def cancel_keyboard(self) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="✖️ Отменить", callback_data=f"{CANCEL_PREFIX}{self.id}")
+        ]])
+
+    async def report(self, text: str, force: bool = False):
+        """Прогресс правкой сообщения задачи; промежуточные правки прореживаются."""
+        now = time.monotonic()
+        if self.cancelled or text == self._text or (not force and now - self._reported_at < PROGRESS_INTERVAL):
+            return
+        self._text, self._reported_at = text, now
+        with suppress(TelegramBadRequest):
+            await self.message.edit_text(text, reply_markup=self.cancel_keyboard)
+
+    async def finish(self, text: str):
+        """Итоговый текст сообщения задачи, без кнопки отмены."""
+        self._text = text
+        with suppress(TelegramBadRequest):
+            await self.message.edit_text(text)
+
+
+class JobRunner:
+    def __init__(self, config: JobsConfig, replica: str):
+        self.config = config
+        self.replica = replica
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._jobs: dict[int, Job] = {}
+        self._workers: list[asyncio.Task] = []
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(self.config.workers, 1))]
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+        logger.info(f"🧰 Фоновые задачи: воркеров {self.config.workers}, очередь до {self.config.queue_size}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job_id in list(self._jobs):
+            db.release_job(job_id)
+
+    def user_jobs(self, user_id: int) -> list[Job]:
+        """Задачи пользователя в этой реплике."""
+        return [job for job in self._jobs.values() if job.user_id == user_id]
+
+    def submit(self, user_id: int, message: types.Message, kind: str,
+               run: Callable[[Job], Awaitable[None]],
+               on_abort: Optional[Callable[[Job], Awaitable[None]]] = None) -> Job:
+        """Ставит задачу в очередь без ожидания; JobRejected — если лимиты исчерпаны."""
+        if self.config.queue_size and self._queue.qsize() >= self.config.queue_size:
+            JOBS_TOTAL.inc(kind=kind, result="rejected")
+            raise JobRejected("⚠️ Сейчас слишком много запросов, попробуйте через минуту.")
+        job_id = db.claim_job(user_id, kind, self.replica, self.config.per_user, LEASE_SECONDS)
+        if job_id is None:
+            JOBS_TOTAL.inc(kind=kind, result="rejected")
+            raise JobRejected("⏳ Предыдущий запрос ещё выполняется — дождитесь его или отмените.")
+
+        self.start()
+        job = Job(id=job_id, user_id=user_id, kind=kind, message=message, run=run, on_abort=on_abort)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        JOBS_QUEUED.inc(kind=kind)
+        return job
+
+    def position(self, job: Job) -> int:
+        """Сколько задач ждут в очереди перед этой."""
+        if job.started_at is not None:
+            return 0
+        waiting = [queued.id for queued in self._jobs.values() if queued.started_at is None and not queued.cancelled]
+        return sum(1 for job_id in waiting if job_id < job.id)
+
+    async def cancel(self, job_id: int, user_id: int) -> bool:
+        """
+        Отменяет задачу пользователя: ожидающую — снимает с очереди, выполняющуюся — прерывает.
+        Задача другой реплики помечается в базе и прерывается её владельцем. False — задачи уже нет.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if job.user_id != user_id or job.cancelled:
+                return False
+            await self._cancel_local(job)
+            return True
+        return db.cancel_job(job_id, user_id)
+
+    async def _cancel_local(self, job: Job):
+        job.cancelled = True
+        if job.task is not None:
+            job.task.cancel()
+            return
+        # воркер пропустит её, взяв из очереди; лимит пользователя освобождается сразу
+        self._jobs.pop(job.id, None)
+        db.release_job(job.id)
+        JOBS_QUEUED.dec(kind=job.kind)
+        JOBS_TOTAL.inc(kind=job.kind, result="cancelled")
+        await job.finish("⛔ Отменено.")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if not self._jobs:
+                continue
+            try:
+                cancelled = db.heartbeat_jobs(self.replica, LEASE_SECONDS)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось продлить фоновые задачи: {e}")
+                continue
+            for job_id in cancelled:
+                job = self._jobs.get(job_id)
+                if job is not None and not job.cancelled:
+                    logger.info(f"⛔ Задача {job.kind} #{job.id} отменена из другой реплики")
+                    await self._cancel_local(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.cancelled:
+                    await self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: Job):
+        job.started_at = time.monotonic()
+        JOBS_QUEUED.dec(kind=job.kind)
+        JOBS_ACTIVE.inc(kind=job.kind)
+        JOB_QUEUE_WAIT.observe(job.started_at - job.enqueued_at, kind=job.kind)
+        result = "done"
+        timeout = self.config.timeout_seconds or None
+        job.task = asyncio.create_task(asyncio.wait_for(job.run(job), timeout))
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                raise  # останавливается сам воркер
+            result = "cancelled"
+            await job.finish("⛔ Отменено.")
+        except asyncio.TimeoutError:
+            result = "timeout"
+            logger.warning(f"⏱ Задача {job.kind} #{job.id} пользователя {job.user_id} прервана по таймауту")
+            await job.finish("⏱ Запрос выполнялся слишком долго и был прерван, попробуйте позже.")
+        except Exception as e:
+            result = "failed"
+            logger.error(f"❌ Задача {job.kind} #{job.id} пользователя {job.user_id}: {e}")
+            await job.finish(f"❌ Ошибка: {e}")
+        finally:
+            self._jobs.pop(job.id, None)
+            db.release_job(job.id)
+            JOBS_ACTIVE.dec(kind=job.kind)
+            JOBS_TOTAL.inc(kind=job.kind, result=result)
+            JOB_DURATION.observe(time.monotonic() - job.started_at, kind=job.kind)
+
+        if result in ("timeout", "failed") and job.on_abort:
+            try:
+                await job.on_abort(job)
+            except Exception as e:
+                logger.error(f"❌ Не удалось завершить задачу {job.kind} #{job.id}: {e}")
+
+
+_config = load_config()
+
+jobs = JobRunner(_config.jobs, _config.worker.worker_id)
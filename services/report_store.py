@@ -0,0 +1,61 @@
+# bot/services/report_store.py
+
+import asyncio
+import os
+from typing import Optional
+
+from loguru import logger
+
+from db import get_report_by_uid, get_report_files
+from utils.metrics import REPORT_SOURCE
+from utils.minio_client import MINIO_ERRORS, download_to, object_name_from_url
+from utils.workspace import ReportFile, Workspace
+
+
+def _archived_objects(event_uid: str) -> list[dict]:
+    files = get_report_files(event_uid)
+    if files:
+        return files
+
+    # отчёты, сохранённые до появления report_files: известен только первый файл
+    report = get_report_by_uid(event_uid)
+    if report and report["document_url_in_minio"]:
+        object_name = object_name_from_url(report["document_url_in_minio"])
+        return [{"filename": os.path.basename(object_name), "object_name": object_name}]
+    return []
+
+
+async def fetch_object(object_name: str, filename: str, workspace: Workspace) -> ReportFile:
+    """Потоковое чтение объекта MinIO в рабочую область (крупные файлы — на диск)."""
+    writer = workspace.spool(filename)
+    await asyncio.to_thread(download_to, object_name, writer)
+    return writer.finish()
+
+
+async def fetch_archived_files(event_uid: str, workspace: Workspace, limit: Optional[int] = None) -> list[ReportFile]:
+    """Файлы события из MinIO. Пустой список — в архиве события нет (или MinIO недоступен)."""
+    objects = _archived_objects(event_uid)[:limit]
+    files = []
+    try:
+        for obj in objects:
+            files.append(await fetch_object(obj["object_name"], obj["filename"], workspace))
+    except MINIO_ERRORS as e:
+        logger.warning(f"⚠️ Не удалось получить {event_uid} из MinIO, пробуем шлюз: {e}")
+        return []
+    return files
+
+
+async def get_report_files_for_event(
+    interfax_client, event_uid: str, file_data: dict, workspace: Workspace, limit: Optional[int] = None
+) -> list[ReportFile]:
+    """Сначала MinIO (LAN), при промахе — скачивание по publicUrl."""
+    if event_uid:
+        files = await fetch_archived_files(event_uid, workspace, limit)
+        if files:
+            REPORT_SOURCE.inc(source="minio")
+            logger.info(f"🗄 Отчёт {event_uid} отдан из MinIO ({len(files)} файл.)")
+            return files
+
+    REPORT_SOURCE.inc(source="gateway")
+    files = await interfax_client.download_and_extract_file(file_data, workspace)
+    return files[:limit]
@@ -0,0 +1,40 @@
+# bot/services/retention.py
+
+import asyncio
+
+from loguru import logger
+
+from config import RetentionConfig
+from db import (
+    DB_PATH,
+    archive_reports,
+    incremental_vacuum,
+    prune_expired_leases,
+    prune_messages,
+    prune_processed_events,
+)
+
+ARCHIVE_PATH = DB_PATH.with_name("bot_archive.db")
+
+
+def run_retention(config: RetentionConfig):
+    # processed_events нужны только для событий текущего дня, старые записи можно удалять
+    events = prune_processed_events(config.processed_events_days) if config.processed_events_days else 0
+    messages = prune_messages(config.messages_days) if config.messages_days else 0
+    reports = archive_reports(config.reports_days, ARCHIVE_PATH) if config.reports_days else 0
+    leases = prune_expired_leases()
+    incremental_vacuum(config.vacuum_pages)
+    logger.info(
+        f"🧹 Очистка БД: processed_events −{events}, messages −{messages}, "
+        f"reports в архив {reports}, аренды −{leases}"
+    )
+
+
+async def retention_worker(config: RetentionConfig):
+    while True:
+        try:
+            # SQLite синхронный — не блокируем event loop на больших DELETE
+            await asyncio.to_thread(run_retention, config)
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки БД: {e}")
+        await asyncio.sleep(config.interval_hours * 3600)
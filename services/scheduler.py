@@ -2,10 +2,16 @@
 
 import asyncio
 from aiogram import Bot
+from loguru import logger
 from clients.interfax_client import interfax_client
 from services.dispatcher import process_events
+from utils.workspace import cleanup_orphans
 
-async def periodic_worker(bot: Bot, interval: int):
+async def periodic_worker(bot: Bot, interval: int, shard=None):
     while True:
-        await process_events(bot, interfax_client)
+        try:
+            await process_events(bot, interfax_client, shard=shard)
+        except Exception as e:
+            logger.error(f"❌ Ошибка фоновой проверки: {e}")
+        cleanup_orphans()
         await asyncio.sleep(interval * 60)
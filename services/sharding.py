@@ -0,0 +1,80 @@
+# bot/services/sharding.py
+
+import asyncio
+import bisect
+import hashlib
+
+from loguru import logger
+
+from db import (
+    heartbeat_worker,
+    list_live_workers,
+    release_worker,
+    acquire_inn_lease,
+    release_inn_lease,
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентное хеширование ИНН по воркерам (с виртуальными узлами)."""
+
+    def __init__(self, nodes: list[str], replicas: int = 64):
+        self._ring = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    def get_node(self, key: str):
+        if not self._ring:
+            return None
+        idx = bisect.bisect(self._keys, _hash(key)) % len(self._ring)
+        return self._ring[idx][1]
+
+
+class ShardCoordinator:
+    """
+    Распределяет ИНН между воркерами через общую SQLite-базу:
+    - каждый воркер продлевает свою аренду (heartbeat);
+    - ИНН принадлежит воркеру по консистентному хешу среди живых воркеров;
+    - перед опросом ИНН воркер берёт на него аренду, чтобы при смене
+      состава воркеров один и тот же ИНН не опрашивался дважды.
+    """
+
+    def __init__(self, worker_id: str, lease_seconds: int):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._ring = HashRing([worker_id])
+
+    def heartbeat(self):
+        heartbeat_worker(self.worker_id, self.lease_seconds)
+        workers = list_live_workers()
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        self._ring = HashRing(workers)
+
+    async def run_heartbeat(self):
+        while True:
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"❌ Ошибка heartbeat воркера {self.worker_id}: {e}")
+            await asyncio.sleep(max(self.lease_seconds // 3, 1))
+
+    def owns(self, inn: str) -> bool:
+        return self._ring.get_node(inn) == self.worker_id
+
+    def claim(self, inn: str) -> bool:
+        return self.owns(inn) and acquire_inn_lease(inn, self.worker_id, self.lease_seconds)
+
+    def release(self, inn: str):
+        release_inn_lease(inn, self.worker_id)
+
+    def shutdown(self):
+        release_worker(self.worker_id)
+        logger.info(f"👋 Воркер {self.worker_id} снят с регистрации")
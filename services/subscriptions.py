@@ -0,0 +1,140 @@
+# bot/services/subscriptions.py
+
+import threading
+import time
+from datetime import datetime
+
+from loguru import logger
+
+import db
+
+
+class SubscriptionRegistry:
+    """
+    Реестр подписок в памяти процесса: флаг подписки пользователя, его компании и
+    подписчики каждого ИНН. Загружается из SQLite один раз, обновляется при каждой
+    записи через методы реестра. Другие процессы (роли bot/worker) узнают об изменениях
+    по счётчику версии в таблице meta — он проверяется не чаще раза в REFRESH_INTERVAL.
+    """
+
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = 0
+        self._checked_at = 0.0
+        self._users: dict[int, dict] = {}
+        self._companies: dict[int, dict[str, dict]] = {}
+        self._followers: dict[str, set[int]] = {}
+
+    def load(self):
+        version = db.get_subscriptions_version()
+        users, companies = db.load_subscription_snapshot()
+        with self._lock:
+            self._users = {u["user_id"]: u for u in users}
+            self._companies = {}
+            self._followers = {}
+            for row in companies:
+                self._companies.setdefault(row["user_id"], {})[row["inn"]] = row
+                self._followers.setdefault(row["inn"], set()).add(row["user_id"])
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._loaded = True
+        logger.info(f"📇 Реестр подписок загружен: пользователей {len(users)}, связей с компаниями {len(companies)}")
+
+    def refresh(self, force: bool = False):
+        if not self._loaded:
+            self.load()
+            return
+        if not force and time.monotonic() - self._checked_at < self.REFRESH_INTERVAL:
+            return
+        self._checked_at = time.monotonic()
+        if db.get_subscriptions_version() != self._version:
+            self.load()
+
+    def _written(self):
+        # если между нашими записями кто-то ещё менял подписки — перечитаем при следующем чтении
+        version = db.bump_subscriptions_version()
+        with self._lock:
+            if version == self._version + 1:
+                self._version = version
+            else:
+                self._checked_at = 0.0
+
+    # --- чтение ---
+
+    def is_subscribed(self, user_id: int) -> bool:
+        self.refresh()
+        user = self._users.get(user_id)
+        return bool(user and user["is_subscribed"])
+
+    def list_companies(self, user_id: int) -> list[dict]:
+        """Компании пользователя, новые первыми (как db.list_user_companies)."""
+        self.refresh()
+        return [dict(row) for row in reversed(list(self._companies.get(user_id, {}).values()))]
+
+    def has_company(self, user_id: int, inn: str) -> bool:
+        self.refresh()
+        return inn in self._companies.get(user_id, {})
+
+    def subscribers(self, inn: str) -> set[int]:
+        self.refresh()
+        with self._lock:
+            return {
+                user_id for user_id in self._followers.get(inn, ())
+                if self._users.get(user_id, {}).get("is_subscribed")
+            }
+
+    def subscriptions(self) -> dict[str, tuple[str, list[tuple[int, str]]]]:
+        """ИНН → (название компании, [(user_id, full_name), ...]) по подписанным пользователям."""
+        self.refresh(force=True)
+        result = {}
+        with self._lock:
+            for inn, followers in self._followers.items():
+                users = [
+                    (user_id, self._users[user_id]["full_name"])
+                    for user_id in sorted(followers)
+                    if self._users.get(user_id, {}).get("is_subscribed")
+                ]
+                if users:
+                    result[inn] = (self._companies[users[0][0]][inn]["company_name"], users)
+        return result
+
+    # --- запись (write-through) ---
+
+    def set_subscription(self, user_id: int, full_name: str, subscribed: bool):
+        db.set_subscription(user_id, full_name, subscribed)
+        with self._lock:
+            user = self._users.setdefault(user_id, {"user_id": user_id, "full_name": full_name})
+            user["is_subscribed"] = int(subscribed)
+        self._written()
+
+    def add_user_company(self, user_id: int, inn: str, name: str, ogrn: str = None):
+        db.add_user_company(user_id, inn=inn, name=name, ogrn=ogrn)
+        with self._lock:
+            companies = self._companies.setdefault(user_id, {})
+            if inn not in companies:
+                companies[inn] = {
+                    "user_id": user_id,
+                    "inn": inn,
+                    "company_name": name,
+                    "ogrn": ogrn,
+                    "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                }
+                self._followers.setdefault(inn, set()).add(user_id)
+        self._written()
+
+    def remove_user_company(self, user_id: int, inn: str):
+        db.remove_user_company(user_id, inn)
+        with self._lock:
+            self._companies.get(user_id, {}).pop(inn, None)
+            followers = self._followers.get(inn)
+            if followers is not None:
+                followers.discard(user_id)
+                if not followers:
+                    del self._followers[inn]
+        self._written()
+
+
+registry = SubscriptionRegistry()
@@ -0,0 +1,58 @@
+# bot/services/webhook.py
+"""
+Режим webhook (BOT_UPDATE_MODE=webhook): апдейты принимает встроенный aiohttp-сервер.
+Запрос проверяется по заголовку X-Telegram-Bot-Api-Secret-Token, Telegram получает ответ
+сразу, а хэндлеры выполняются отдельными задачами. Реплик может быть несколько за
+балансировщиком — состояние FSM при этом хранится в SQLite (FSM_STORAGE=sqlite).
+"""
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+
+from config import WebhookConfig
+
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, config: WebhookConfig) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.secret,
+        handle_in_background=True,  # 200 сразу, хэндлер — задачей
+    ).register(app, path=config.path)
+    app.router.add_get("/healthz", _healthz)  # для проверок балансировщика
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def register_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig):
+    # вызывается каждой репликой: set_webhook с теми же параметрами идемпотентен
+    await bot.set_webhook(
+        url=config.url.rstrip("/") + config.path,
+        secret_token=config.secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=config.max_connections,
+    )
+    logger.info(f"🪝 Webhook зарегистрирован: {config.url.rstrip('/')}{config.path}")
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig):
+    if not config.url:
+        raise ValueError("WEBHOOK_URL не задан — режим webhook недоступен")
+
+    runner = web.AppRunner(build_webhook_app(dp, bot, config), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    logger.info(f"🚀 Сервер webhook слушает {config.host}:{config.port}{config.path}")
+    await register_webhook(dp, bot, config)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,104 @@
+# bot/utils/archives.py
+"""
+Потоковый разбор архивов отчётов: члены архива читаются по одному прямо из скачанного
+содержимого и попадают в память (или, если крупные, в файл рабочей области) —
+без extractall во временную директорию и повторного чтения с диска.
+"""
+import io
+import os
+import shutil
+import zipfile
+
+from utils.workspace import ReportFile, SpoolWriter, Workspace
+
+try:
+    import py7zr
+    from py7zr.io import Py7zIO, WriterFactory
+    _has_7z = True
+except ImportError:
+    _has_7z = False
+
+CHUNK_SIZE = 1024 * 1024
+SUPPORTED_SUFFIXES = {".zip", ".7z"} if _has_7z else {".zip"}
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    name = info.filename
+    if not info.flag_bits & 0x800:
+        # без UTF-8 флага имена в архивах с e-disclosure обычно в cp866
+        try:
+            name = name.encode("cp437").decode("cp866")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return os.path.basename(name.rstrip("/"))
+
+
+def iter_zip_members(content: bytes, workspace: Workspace):
+    with zipfile.ZipFile(io.BytesIO(content), "r") as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            writer = workspace.spool(_zip_member_name(info))
+            with zip_ref.open(info) as member:
+                shutil.copyfileobj(member, writer, CHUNK_SIZE)
+            yield writer.finish()
+
+
+if _has_7z:
+    class _SpoolIO(Py7zIO):
+        def __init__(self, writer: SpoolWriter):
+            self.writer = writer
+
+        def write(self, s) -> int:
+            return self.writer.write(bytes(s))
+
+        def read(self, size=None) -> bytes:
+            return b""
+
+        def seek(self, offset: int, whence: int = 0) -> int:
+            return self.writer.size()
+
+        def flush(self) -> None:
+            pass
+
+        def size(self) -> int:
+            return self.writer.size()
+
+    class _SpoolFactory(WriterFactory):
+        def __init__(self, workspace: Workspace):
+            self.workspace = workspace
+            self.writers: list[SpoolWriter] = []
+
+        def create(self, filename: str) -> Py7zIO:
+            writer = self.workspace.spool(os.path.basename(filename))
+            self.writers.append(writer)
+            return _SpoolIO(writer)
+
+
+def iter_7z_members(content: bytes, workspace: Workspace):
+    factory = _SpoolFactory(workspace)
+    with py7zr.SevenZipFile(io.BytesIO(content), mode="r") as archive:
+        archive.extractall(factory=factory)
+    for writer in factory.writers:
+        yield writer.finish()
+
+
+def _unique_names(files: list[ReportFile]) -> list[ReportFile]:
+    """Одноимённые файлы из разных папок архива: «отчет.pdf», «отчет (2).pdf» — иначе в MinIO перезапишут друг друга."""
+    seen: set[str] = set()
+    for file in files:
+        stem, ext = os.path.splitext(file.filename)
+        number = 1
+        while file.filename.lower() in seen:
+            number += 1
+            file.filename = f"{stem} ({number}){ext}"
+        seen.add(file.filename.lower())
+    return files
+
+
+def extract_members(content: bytes, suffix: str, workspace: Workspace) -> list[ReportFile]:
+    if suffix == ".zip":
+        return _unique_names(list(iter_zip_members(content, workspace)))
+    if suffix == ".7z" and _has_7z:
+        return _unique_names(list(iter_7z_members(content, workspace)))
+    raise ValueError(f"Расширение {suffix} не поддерживается")
@@ -0,0 +1,120 @@
+# bot/utils/file_cache.py
+"""
+Дисковый кэш скачанных файлов отчётов (ключ — publicUrl).
+
+Хранится исходное содержимое файла: архивы разбираются потоково в памяти (utils/archives),
+поэтому повторная распаковка из кэша дешевле, чем хранение распакованных копий.
+Запись атомарная (временный файл + os.replace), вытеснение — LRU по размеру:
+при попадании у файла обновляется mtime, при превышении лимита удаляются самые старые.
+Индекс строится сканированием директории, поэтому кэш переживает перезапуск.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+MB = 1024 * 1024
+
+
+class FileCache:
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional[dict[str, tuple[int, float]]] = None  # ключ → (размер, mtime)
+        self._total = 0
+
+    @staticmethod
+    def key(public_url: str) -> str:
+        return hashlib.sha256(public_url.encode()).hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        base = self.directory / key[:2] / key
+        return base.with_suffix(".bin"), base.with_suffix(".json")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total = 0
+        if self.directory.exists():
+            for data_path in self.directory.glob("*/*.bin"):
+                try:
+                    stat = data_path.stat()
+                except OSError:
+                    continue
+                self._index[data_path.stem] = (stat.st_size, stat.st_mtime)
+                self._total += stat.st_size
+        logger.info(f"🗃 Кэш файлов: {len(self._index)} шт., {self._total // MB} МБ")
+
+    def get(self, key: str) -> Optional[tuple[bytes, str]]:
+        """Возвращает (содержимое, расширение) или None."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                content = f.read()
+            os.utime(data_path)
+            mtime = data_path.stat().st_mtime
+        except (OSError, ValueError):
+            return None
+
+        with self._lock:
+            self._load_index()
+            # ключ мог записать другой процесс после загрузки индекса — тогда он ещё не в _total
+            previous = self._index.get(key, (0, 0))[0]
+            self._index[key] = (len(content), mtime)
+            self._total += len(content) - previous
+            self._evict()
+        return content, meta["suffix"]
+
+    def put(self, key: str, content: bytes, suffix: str, source: str = ""):
+        if len(content) > self.max_bytes:
+            return
+        data_path, meta_path = self._paths(key)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        self._atomic_write(data_path, content)
+        self._atomic_write(meta_path, json.dumps({"suffix": suffix, "source": source}).encode())
+
+        with self._lock:
+            self._load_index()
+            previous = self._index.get(key, (0, 0))[0]
+            self._index[key] = (len(content), data_path.stat().st_mtime)
+            self._total += len(content) - previous
+            self._evict()
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+            del self._index[key]
+            self._total -= size
+            logger.info(f"🗃 Вытеснен из кэша: {key[:12]} ({size} байт)")
+
+
+_max_mb = int(os.getenv("FILE_CACHE_MAX_MB", "1024"))
+file_cache = FileCache(
+    Path(os.getenv("FILE_CACHE_DIR", Path(__file__).parent.parent.parent / "data" / "cache" / "files")),
+    _max_mb * MB,
+) if _max_mb else None
@@ -0,0 +1,53 @@
+# bot/utils/fsm_storage.py
+import json
+from typing import Any, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from db import get_db
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в общей SQLite-базе: состояние переживает рестарт и видно всем процессам бота."""
+
+    def __init__(self):
+        self._key_builder = DefaultKeyBuilder(with_destiny=True)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        with get_db() as conn:
+            conn.execute(
+                """
+                INSERT INTO fsm_storage (key, state) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET state = excluded.state
+                """,
+                (self._key_builder.build(key), value)
+            )
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        with get_db() as conn:
+            row = conn.execute(
+                "SELECT state FROM fsm_storage WHERE key = ?", (self._key_builder.build(key),)
+            ).fetchone()
+            return row["state"] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        with get_db() as conn:
+            conn.execute(
+                """
+                INSERT INTO fsm_storage (key, data) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET data = excluded.data
+                """,
+                (self._key_builder.build(key), json.dumps(dict(data), ensure_ascii=False))
+            )
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        with get_db() as conn:
+            row = conn.execute(
+                "SELECT data FROM fsm_storage WHERE key = ?", (self._key_builder.build(key),)
+            ).fetchone()
+            return json.loads(row["data"]) if row and row["data"] else {}
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,218 @@
+# bot/utils/metrics.py
+"""
+Минимальный реестр метрик в формате Prometheus (counter / gauge / histogram с метками)
+и HTTP-эндпоинт /metrics на aiohttp внутри процесса бота.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiohttp import web
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, value if not isinstance(value, list) else [list(value[0]), value[1], value[2]])
+                     for key, value in self._values.items()]
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key: tuple, value) -> list[str]:
+        bucket_counts, total, count = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {bucket_count}"
+            for bound, bucket_count in zip(self.buckets, bucket_counts)
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# --- Метрики бота ---
+
+INTERFAX_REQUESTS = Counter("interfax_requests_total", "Запросы к API Интерфакса", ("endpoint", "status"))
+INTERFAX_LATENCY = Histogram("interfax_request_duration_seconds", "Длительность запросов к API Интерфакса", ("endpoint",))
+LIMITER_WAIT = Histogram("interfax_limiter_wait_seconds", "Ожидание семафора/лимитера запросов Интерфакса")
+INTERFAX_ACCOUNT_REQUESTS = Counter("interfax_account_requests_total", "Запросы к Интерфаксу по аккаунтам", ("account", "status"))
+INTERFAX_ACCOUNT_IN_FLIGHT = Gauge("interfax_account_pending", "Запросы аккаунта, ждущие лимитера или выполняющиеся", ("account",))
+INTERFAX_ACCOUNT_HEALTHY = Gauge("interfax_account_healthy", "Аккаунт Интерфакса в ротации (1) или на паузе (0)", ("account",))
+LIMITER_IN_FLIGHT = Gauge("interfax_limiter_in_flight", "Запросы Интерфакса, выполняющиеся сейчас")
+
+DOWNLOAD_LATENCY = Histogram("download_duration_seconds", "Длительность скачивания файлов по publicUrl")
+DOWNLOAD_BYTES = Counter("download_bytes_total", "Скачано байт по publicUrl")
+DOWNLOAD_RESULTS = Counter("downloads_total", "Скачивания по результату", ("result",))
+EXTRACT_LATENCY = Histogram("extract_duration_seconds", "Длительность распаковки архивов", ("format",))
+
+MINIO_UPLOAD_LATENCY = Histogram("minio_upload_duration_seconds", "Длительность загрузки в MinIO")
+MINIO_UPLOAD_BYTES = Counter("minio_upload_bytes_total", "Загружено байт в MinIO")
+
+REPORT_SOURCE = Counter("report_files_source_total", "Откуда получены файлы отчёта для повторной отправки", ("source",))
+
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Состояние circuit breaker: 0 — закрыт, 1 — пробный запрос, 2 — открыт", ("dependency",))
+CIRCUIT_REJECTED = Counter("circuit_breaker_rejected_total", "Вызовы, отклонённые открытым circuit breaker", ("dependency",))
+RETRIES = Counter("dependency_retries_total", "Повторы вызовов внешних зависимостей", ("dependency",))
+HEDGED_REQUESTS = Counter("hedged_requests_total", "Запущенные hedged-попытки", ("dependency",))
+
+DB_LATENCY = Histogram("db_query_duration_seconds", "Длительность операций с SQLite", ("query",))
+
+TELEGRAM_REQUESTS = Counter("telegram_requests_total", "Запросы к Bot API", ("method", "status"))
+TELEGRAM_LATENCY = Histogram("telegram_request_duration_seconds", "Длительность запросов к Bot API", ("method",))
+TELEGRAM_DIGEST_DOCUMENTS = Counter("telegram_digest_documents_total", "Документы, доставленные дайджестом")
+LINK_DELIVERIES = Counter("link_delivery_files_total", "Файлы, доставленные ссылкой на MinIO вместо загрузки в Telegram")
+
+CYCLE_DURATION = Histogram("dispatch_cycle_duration_seconds", "Длительность цикла process_events")
+CYCLE_EVENTS = Gauge("dispatch_cycle_events", "Новых событий за последний цикл")
+EVENTS_PROCESSED = Counter("dispatch_events_total", "Обработанные события", ("result",))
+ISSUER_DIRECTORY_SIZE = Gauge("issuer_directory_size", "Эмитентов в локальном справочнике")
+ISSUER_SEARCH_LATENCY = Histogram("issuer_search_duration_seconds", "Поиск по справочнику эмитентов",
+                                  buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+ISSUER_LOOKUPS = Counter("issuer_lookups_total", "Добавление компании: откуда взяты данные эмитента", ("source",))
+
+JOBS_QUEUED = Gauge("jobs_queued", "Фоновые задачи хэндлеров в очереди", ("kind",))
+JOBS_ACTIVE = Gauge("jobs_active", "Выполняющиеся фоновые задачи хэндлеров", ("kind",))
+JOBS_TOTAL = Counter("jobs_total", "Фоновые задачи хэндлеров по результату", ("kind", "result"))
+JOB_QUEUE_WAIT = Histogram("job_queue_wait_seconds", "Ожидание фоновой задачи в очереди", ("kind",))
+JOB_DURATION = Histogram("job_duration_seconds", "Длительность фоновых задач хэндлеров", ("kind",))
+
+PUBLISH_TO_DELIVERY = Histogram(
+    "publish_to_delivery_seconds", "От публикации события на шлюзе до первой доставки подписчику",
+    buckets=(30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400, 43200, 86400),
+)
+
+
+def observe_db(func):
+    """Декоратор для функций db.py: время выполнения в db_query_duration_seconds{query=<имя функции>}."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with DB_LATENCY.time(query=func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Мидлварь сессии aiogram: счётчики и латентность каждого вызова Bot API."""
+
+    async def __call__(self, make_request, bot, method):
+        # make_request возвращает результат метода (Message, bool, ...), ошибки Bot API — исключения
+        name = type(method).__name__
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await make_request(bot, method)
+            status = "ok"
+            return result
+        except TelegramAPIError as e:
+            status = type(e).__name__
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, method=name)
+            TELEGRAM_REQUESTS.inc(method=name, status=status)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0") -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -1,9 +1,15 @@
 from minio import Minio
-from minio.error import S3Error
+from minio.error import InvalidResponseError, S3Error, ServerError
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 from dotenv import load_dotenv
 import os
 from loguru import logger
 import io
+import mimetypes
+from datetime import timedelta
+
+from utils import resilience
+from utils.metrics import MINIO_UPLOAD_LATENCY, MINIO_UPLOAD_BYTES
 
 
 load_dotenv()
@@ -17,34 +23,117 @@ client = Minio(
     secure=False,
 )
 
+# ссылки для пользователей подписываются внешним адресом MinIO (хост входит в подпись);
+# регион задан явно, чтобы подпись не требовала запроса к серверу
+public_client = Minio(
+    endpoint=os.getenv("MINIO_PUBLIC_ENDPOINT") or os.getenv("MINIO_ENDPOINT", "localhost:9000"),
+    access_key=os.getenv("MINIO_ACCESS_KEY"),
+    secret_key=os.getenv("MINIO_SECRET_KEY"),
+    secure=os.getenv("MINIO_PUBLIC_SECURE", "0") == "1",
+    region=os.getenv("MINIO_REGION", "us-east-1"),
+)
+
+# коды S3, после которых имеет смысл повторить запрос; остальные S3Error — ошибки запроса
+RETRYABLE_S3_CODES = {"InternalError", "SlowDown", "ServiceUnavailable", "RequestTimeout"}
+
+# всё, чем может закончиться чтение из MinIO, включая недоступный сервер и открытый breaker
+MINIO_ERRORS = (S3Error, ServerError, InvalidResponseError, Urllib3HTTPError, OSError, resilience.CircuitOpenError)
+
+
+def _is_transient_error(error: BaseException) -> bool:
+    if isinstance(error, S3Error):
+        return error.code in RETRYABLE_S3_CODES
+    return isinstance(error, (ServerError, InvalidResponseError, Urllib3HTTPError, ConnectionError))
+
+
 def ensure_bucket():
     if not client.bucket_exists(MINIO_BUCKET):
         client.make_bucket(MINIO_BUCKET)
         logger.info(f"🪣 Bucket `{MINIO_BUCKET}` создан")
 
 def upload_file(file_bytes: bytes, filename: str) -> str:
-    ensure_bucket()
-    stream = io.BytesIO(file_bytes)
-
-    client.put_object(
-        bucket_name=MINIO_BUCKET,
-        object_name=filename,
-        data=stream,
-        length=len(file_bytes),
-        content_type="application/pdf",
-        part_size=30 * 1024 * 1024
-    )
+    def put():
+        ensure_bucket()
+        client.put_object(
+            bucket_name=MINIO_BUCKET,
+            object_name=filename,
+            data=io.BytesIO(file_bytes),
+            length=len(file_bytes),
+            content_type="application/pdf",
+            part_size=30 * 1024 * 1024
+        )
+
+    with MINIO_UPLOAD_LATENCY.time():
+        resilience.minio.call_sync(put, _is_transient_error)
+    MINIO_UPLOAD_BYTES.inc(len(file_bytes))
+
+    return _object_url(filename)
+
+
+def upload_stream(stream, length: int, object_name: str) -> str:
+    """Загрузка из файлового потока без чтения крупного документа в память целиком."""
+    content_type = mimetypes.guess_type(object_name)[0] or "application/octet-stream"
 
+    def put():
+        ensure_bucket()
+        client.put_object(
+            bucket_name=MINIO_BUCKET,
+            object_name=object_name,
+            data=stream,
+            length=length,
+            content_type=content_type,
+            part_size=30 * 1024 * 1024
+        )
+
+    # повтор возможен, только если поток можно перемотать к началу
+    start = stream.tell() if stream.seekable() else None
+    with MINIO_UPLOAD_LATENCY.time():
+        resilience.minio.call_sync(
+            put,
+            _is_transient_error if start is not None else (lambda error: False),
+            before_retry=lambda: stream.seek(start),
+        )
+    MINIO_UPLOAD_BYTES.inc(length)
+    return _object_url(object_name)
+
+
+def object_url(object_name: str) -> str:
     MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
-    url = f"http://{MINIO_ENDPOINT}/{MINIO_BUCKET}/{filename}"
+    return f"http://{MINIO_ENDPOINT}/{MINIO_BUCKET}/{object_name}"
+
+
+def _object_url(object_name: str) -> str:
+    url = object_url(object_name)
     logger.info(f"📁 Файл загружен в MinIO: {url}")
     return url
 
 
 
+def object_name_from_url(url: str) -> str:
+    """Имя объекта из URL, сохранённого в reports.document_url_in_minio."""
+    return url.split(f"/{MINIO_BUCKET}/", 1)[-1]
+
+
+def presigned_url(object_name: str, expires: timedelta) -> str:
+    """Временная ссылка на скачивание объекта без доступа к бакету (не дольше 7 дней)."""
+    return public_client.presigned_get_object(MINIO_BUCKET, object_name, expires=min(expires, timedelta(days=7)))
+
+
+def download_to(object_name: str, writer, chunk_size: int = 1024 * 1024):
+    """Потоковое чтение объекта в writer (например, SpoolWriter рабочей области)."""
+    # повторяется только открытие ответа: начатую запись в writer не откатить
+    response = resilience.minio.call_sync(lambda: client.get_object(MINIO_BUCKET, object_name), _is_transient_error)
+    try:
+        for chunk in response.stream(chunk_size):
+            writer.write(chunk)
+    finally:
+        response.close()
+        response.release_conn()
+
+
 def download_file(filename: str) -> bytes:
     try:
-        response = client.get_object(MINIO_BUCKET, filename)
+        response = resilience.minio.call_sync(lambda: client.get_object(MINIO_BUCKET, filename), _is_transient_error)
         data = response.read()
         response.close()
         return data
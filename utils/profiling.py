@@ -0,0 +1,124 @@
+# bot/utils/profiling.py
+"""
+Профилирование по запросу:
+- каждый N-й цикл process_events или следующий цикл после создания файла-триггера
+  `<PROFILE_DIR>/profile_next_cycle` снимается cProfile (включать можно без передеплоя);
+- доля апдейтов Telegram (PROFILE_HANDLER_SAMPLE_RATE) профилируется мидлварью;
+- операции дольше SLOW_OP_THRESHOLD_MS пишутся в slow_ops.log со стеком и контекстом.
+Профили (.prof) складываются в PROFILE_DIR, старые удаляются сверх PROFILE_KEEP_FILES.
+Смотреть: `python -m pstats data/profiles/<файл>.prof` или snakeviz.
+
+cProfile в asyncio учитывает всё, что выполнялось в event loop за время замера,
+включая параллельные задачи, — это нужно учитывать при чтении профиля.
+"""
+import cProfile
+import random
+import threading
+import time
+import traceback
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+
+from config import ProfilingConfig, load_config
+
+TRIGGER_FILE = "profile_next_cycle"
+
+
+class Profiler:
+    def __init__(self, config: ProfilingConfig):
+        self.config = config
+        self.directory = Path(config.directory)
+        self._cycle = 0
+        self._active = threading.Lock()  # одновременно может работать только один cProfile
+        if config.slow_op_threshold_ms:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            logger.add(
+                self.directory / "slow_ops.log",
+                filter=lambda record: record["extra"].get("slow_op", False),
+                format="{time} | {message}",
+                rotation="10 MB",
+                retention=5,
+            )
+
+    def _trigger_requested(self) -> bool:
+        trigger = self.directory / TRIGGER_FILE
+        if trigger.exists():
+            trigger.unlink(missing_ok=True)
+            return True
+        return False
+
+    def should_profile_cycle(self) -> bool:
+        self._cycle += 1
+        every = self.config.every_n_cycles
+        return self._trigger_requested() or bool(every and self._cycle % every == 0)
+
+    def should_profile_handler(self) -> bool:
+        return random.random() < self.config.handler_sample_rate
+
+    def _rotate(self):
+        profiles = sorted(self.directory.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+        for old in profiles[:max(len(profiles) - self.config.keep_files, 0)]:
+            old.unlink(missing_ok=True)
+
+    @asynccontextmanager
+    async def profile(self, name: str, enabled: bool = True):
+        if not enabled or not self._active.acquire(blocking=False):
+            yield
+            return
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            yield
+        finally:
+            profile.disable()
+            self._active.release()
+            elapsed = time.perf_counter() - started
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{datetime.utcnow():%Y%m%dT%H%M%S}_{name}_{elapsed:.1f}s.prof"
+            profile.dump_stats(path)
+            self._rotate()
+            logger.info(f"🧪 Профиль {name} сохранён: {path}")
+
+    @contextmanager
+    def slow_op(self, name: str, **context: Any):
+        """Пишет в slow_ops.log операции дольше порога вместе со стеком вызова и контекстом."""
+        threshold = self.config.slow_op_threshold_ms
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if threshold and elapsed_ms > threshold:
+                stack = "".join(traceback.format_stack()[:-2])
+                details = ", ".join(f"{k}={v}" for k, v in context.items())
+                logger.bind(slow_op=True).warning(
+                    f"🐢 {name} — {elapsed_ms:.0f} мс ({details})\n{stack}"
+                )
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Профилирует выборку апдейтов (outer-мидлварь на dp.update)."""
+
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with self.profiler.slow_op("update", update_id=getattr(event, "update_id", None)):
+            async with self.profiler.profile("handler", enabled=self.profiler.should_profile_handler()):
+                return await handler(event, data)
+
+
+profiler = Profiler(load_config().profiling)
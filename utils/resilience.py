@@ -0,0 +1,253 @@
+# bot/utils/resilience.py
+"""
+Устойчивость к сбоям внешних зависимостей: шлюз Интерфакса, хост файлов (publicUrl), MinIO.
+
+Для каждой зависимости:
+- circuit breaker — после RESILIENCE_BREAKER_FAILURES подряд неудачных вызовов зависимость
+  считается недоступной на RESILIENCE_BREAKER_RESET_SECONDS: вызовы сразу завершаются
+  CircuitOpenError вместо ожидания таймаутов; затем один пробный вызов (half-open) решает,
+  закрыть ли breaker;
+- повторы с экспоненциальной задержкой и полным джиттером, не больше RESILIENCE_RETRY_ATTEMPTS
+  попыток, в пределах бюджета повторов — не больше RESILIENCE_RETRY_BUDGET повторов на один
+  первичный вызов в среднем, чтобы при массовом сбое повторы не умножали нагрузку;
+- hedged-запросы (только идемпотентные GET, если включено RESILIENCE_HEDGE_PERCENTILE):
+  если попытка идёт дольше p-го перцентиля последних удачных, параллельно запускается вторая,
+  используется первый ответ.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from loguru import logger
+
+from config import ResilienceConfig, load_config
+from utils.metrics import CIRCUIT_REJECTED, CIRCUIT_STATE, HEDGED_REQUESTS, RETRIES
+
+
+class CircuitOpenError(Exception):
+    """Зависимость недоступна — вызов отклонён без обращения к ней."""
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()  # MinIO вызывается из потоков
+        CIRCUIT_STATE.set(0, dependency=name)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"🔌 {self.name}: circuit breaker {self.state} → {state}")
+        self.state = state
+        CIRCUIT_STATE.set(self._STATE_VALUES[state], dependency=self.name)
+
+    @property
+    def is_open(self) -> bool:
+        """Открыт и ещё не пора пробовать — вызовы будут отклонены."""
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    CIRCUIT_REJECTED.inc(dependency=self.name)
+                    raise CircuitOpenError(f"{self.name} недоступен (circuit breaker открыт)")
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    CIRCUIT_REJECTED.inc(dependency=self.name)
+                    raise CircuitOpenError(f"{self.name}: идёт пробный запрос")
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def release_probe(self):
+        """Попытка отменена, не дав ответа — пробный слот освобождается без смены состояния."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+class RetryBudget:
+    """Каждый первичный вызов пополняет бюджет на ratio, каждый повтор тратит единицу."""
+
+    def __init__(self, ratio: float, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.reserve)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._values: deque[float] = deque(maxlen=size)
+
+    def observe(self, value: float):
+        self._values.append(value)
+
+    def percentile(self, q: float, min_samples: int) -> Optional[float]:
+        if len(self._values) < min_samples:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+
+class Dependency:
+    def __init__(self, name: str, config: ResilienceConfig):
+        self.name = name
+        self.config = config
+        self.breaker = CircuitBreaker(name, config.breaker_failures, config.breaker_reset_seconds)
+        self.budget = RetryBudget(config.retry_budget)
+        self.latencies = LatencyWindow()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.config.retry_max_delay, self.config.retry_base_delay * 2 ** attempt))
+
+    def _may_retry(self, attempt: int) -> bool:
+        if attempt + 1 >= self.config.retry_attempts or not self.budget.withdraw():
+            return False
+        RETRIES.inc(dependency=self.name)
+        return True
+
+    async def call(
+        self,
+        attempt: Callable[[], Awaitable[Any]],
+        retryable: Callable[[BaseException], bool],
+        failed: Callable[[Any], bool] = lambda result: False,
+        hedge: bool = False,
+    ) -> Any:
+        """
+        attempt — функция, создающая новую попытку (корутину). retryable — какие исключения
+        считать сбоем зависимости, failed — какие результаты (например, HTTP 5xx). Исключения
+        вне retryable пробрасываются сразу и не открывают breaker. Если повторы закончились
+        на неудачном результате, он возвращается вызывающему как есть.
+        """
+        self.budget.deposit()
+        for number in range(max(self.config.retry_attempts, 1)):
+            self.breaker.before_call()
+            try:
+                result = await self._hedged(attempt) if hedge else await self._timed(attempt)
+            except (asyncio.CancelledError, CircuitOpenError):
+                # CircuitOpenError изнутри попытки — отказ другого breaker'а, а не ответ зависимости:
+                # состояние не меняем, только освобождаем пробный слот
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not retryable(e):
+                    self.breaker.record_success()  # зависимость ответила, ошибка на нашей стороне
+                    raise
+                self.breaker.record_failure()
+                if not self._may_retry(number):
+                    raise
+                logger.warning(f"🔁 {self.name}: {type(e).__name__} {e} — повтор #{number + 1}")
+            else:
+                if not failed(result):
+                    self.breaker.record_success()
+                    return result
+                self.breaker.record_failure()
+                if not self._may_retry(number):
+                    return result
+                logger.warning(f"🔁 {self.name}: неуспешный ответ — повтор #{number + 1}")
+            await asyncio.sleep(self._backoff(number))
+
+    async def _timed(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        result = await attempt()
+        self.latencies.observe(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        delay = None
+        if self.config.hedge_percentile:
+            delay = self.latencies.percentile(self.config.hedge_percentile, self.config.hedge_min_samples)
+        first = asyncio.create_task(self._timed(attempt))
+        if delay is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        HEDGED_REQUESTS.inc(dependency=self.name)
+        second = asyncio.create_task(self._timed(attempt))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # упавшую попытку игнорируем, пока жива вторая
+                    if task.exception() is None or not pending:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def call_sync(
+        self,
+        attempt: Callable[[], Any],
+        retryable: Callable[[BaseException], bool],
+        before_retry: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """То же для синхронных клиентов (MinIO); вызывать из рабочих потоков, не из event loop."""
+        self.budget.deposit()
+        for number in range(max(self.config.retry_attempts, 1)):
+            self.breaker.before_call()
+            try:
+                result = attempt()
+            except CircuitOpenError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not retryable(e):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if not self._may_retry(number):
+                    raise
+                logger.warning(f"🔁 {self.name}: {type(e).__name__} {e} — повтор #{number + 1}")
+                time.sleep(self._backoff(number))
+                if before_retry:
+                    before_retry()
+            else:
+                self.breaker.record_success()
+                return result
+
+
+_config = load_config().resilience
+
+gateway = Dependency("gateway", _config)
+download_host = Dependency("download", _config)
+minio = Dependency("minio", _config)
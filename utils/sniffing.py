@@ -0,0 +1,84 @@
+# bot/utils/sniffing.py
+"""
+Определение типа скачиваемого файла по заголовкам и первым байтам ответа — до чтения тела.
+
+HTML-страницы (ошибка или капча вместо файла), неизвестные форматы и ответы больше лимита
+отбрасываются сразу: соединение закрывается, не скачав остальное. Сигнатуры проверяются
+строго, со смещения 0 (кроме PDF, у которого по спецификации перед заголовком допустим мусор
+в пределах первого килобайта), поэтому ZIP с PDF внутри не принимается за PDF.
+"""
+from typing import Optional
+
+import httpx
+
+from utils.archives import SUPPORTED_SUFFIXES
+
+SNIFF_BYTES = 1024
+
+_ARCHIVE_SIGNATURES = (
+    (b"PK\x03\x04", ".zip"),
+    (b"PK\x05\x06", ".zip"),  # пустой архив
+    (b"7z\xbc\xaf\x27\x1c", ".7z"),
+)
+_HTML_PREFIXES = (b"<!doctype html", b"<html", b"<head", b"<body")
+
+
+class ContentRejected(Exception):
+    """Ответ не является поддерживаемым файлом отчёта; reason — метка для метрик."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def detect_suffix(head: bytes) -> Optional[str]:
+    for signature, suffix in _ARCHIVE_SIGNATURES:
+        if head.startswith(signature):
+            return suffix
+    if b"%PDF-" in head[:SNIFF_BYTES]:
+        return ".pdf"
+    return None
+
+
+def _is_html(head: bytes, content_type: str) -> bool:
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    return text.startswith(_HTML_PREFIXES) or content_type.startswith("text/html")
+
+
+def check_head(head: bytes, content_type: str) -> str:
+    """Расширение файла по первым байтам; ContentRejected — если это не файл отчёта."""
+    suffix = detect_suffix(head)
+    if suffix is None:
+        if _is_html(head, content_type):
+            raise ContentRejected("html", "вместо файла получен HTML")
+        raise ContentRejected("unsupported", f"неизвестный формат (Content-Type: {content_type or '-'})")
+    if suffix != ".pdf" and suffix not in SUPPORTED_SUFFIXES:
+        raise ContentRejected("unsupported", f"формат {suffix} не поддерживается")
+    return suffix
+
+
+async def read_checked(response: httpx.Response, max_bytes: int) -> tuple[bytes, str]:
+    """
+    Читает тело потокового ответа (client.send(..., stream=True)), проверяя Content-Length
+    до чтения, тип — по первому SNIFF_BYTES, размер — по мере чтения.
+    Возвращает (содержимое, расширение).
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    declared = response.headers.get("Content-Length", "")
+    if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+        raise ContentRejected("too_large", f"файл {int(declared)} байт больше лимита {max_bytes}")
+
+    chunks: list[bytes] = []
+    size = 0
+    suffix = None
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise ContentRejected("too_large", f"файл больше лимита {max_bytes} байт")
+        if suffix is None and size >= SNIFF_BYTES:
+            chunks = [b"".join(chunks)]
+            suffix = check_head(chunks[0][:SNIFF_BYTES], content_type)
+
+    content = b"".join(chunks)
+    return content, suffix or check_head(content, content_type)
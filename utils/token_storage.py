@@ -1,19 +1,20 @@
 # bot/utils/token_storage.py
 import json
+import os
 from datetime import datetime
 from pathlib import Path
 
-TOKEN_FILE = Path(__file__).parent.parent.parent / "data" / "interfax_token.json"
+TOKEN_FILE = Path(os.getenv("INTERFAX_TOKEN_FILE", Path(__file__).parent.parent.parent / "data" / "interfax_token.json"))
 
-def load_token_from_file():
-    if not TOKEN_FILE.exists():
+def load_token_from_file(path: Path = TOKEN_FILE):
+    if not path.exists():
         return None, None
-    with open(TOKEN_FILE, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
         return data.get("token"), data.get("expirationDate")
 
-def save_token_to_file(token: str, expiration_date: str):
-    with open(TOKEN_FILE, "w", encoding="utf-8") as f:
+def save_token_to_file(token: str, expiration_date: str, path: Path = TOKEN_FILE):
+    with open(path, "w", encoding="utf-8") as f:
         json.dump({
             "token": token,
             "expirationDate": expiration_date
@@ -0,0 +1,208 @@
+# bot/utils/tracing.py
+"""
+Трассировка пути события: опрос → скачивание → распаковка → MinIO → send_document.
+
+API повторяет OpenTelemetry (get_tracer / start_as_current_span / set_attribute / add_event /
+record_exception / set_status), поэтому при переходе на opentelemetry-sdk меняется только импорт.
+Внешний коллектор не нужен: спаны пишутся экспортером, выбранным в TRACING_EXPORTER:
+- none — трассировка выключена, спаны не создаются;
+- console — одна JSON-строка на спан в stdout;
+- file — JSON Lines в TRACING_FILE (поля как в OTLP/JSON: traceId, spanId, parentSpanId, ...).
+
+Все спаны события относятся к одной трассе: traceId детерминированно выводится из UID события
+(trace_id_for), так что по UID из жалобы пользователя трасса находится `grep`-ом.
+"""
+import contextvars
+import hashlib
+import json
+import secrets
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+from loguru import logger
+
+from config import TracingConfig, load_config
+
+
+class StatusCode:
+    UNSET = "UNSET"
+    OK = "OK"
+    ERROR = "ERROR"
+
+
+def trace_id_for(key: str) -> str:
+    """128-битный traceId из произвольного ключа (UID события)."""
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[dict],
+                 exporter):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.events: list[dict] = []
+        self.status = StatusCode.UNSET
+        self.status_description = ""
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+        self._exporter = exporter
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[dict] = None):
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes or {}})
+
+    def record_exception(self, exc: BaseException):
+        self.add_event("exception", {
+            "exception.type": type(exc).__name__,
+            "exception.message": str(exc),
+            "exception.stacktrace": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+        })
+
+    def set_status(self, status: str, description: str = ""):
+        self.status = status
+        self.status_description = description
+
+    def end(self):
+        if self.end_time is not None:
+            return
+        self.end_time = time.time_ns()
+        self._exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_time,
+            "endTimeUnixNano": self.end_time,
+            "durationMs": round((self.end_time - self.start_time) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_description},
+        }
+
+
+class _NonRecordingSpan:
+    """Спан-заглушка при выключенной трассировке: все вызовы — no-op."""
+
+    trace_id = ""
+    span_id = ""
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: dict):
+        pass
+
+    def add_event(self, name: str, attributes: Optional[dict] = None):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def set_status(self, status: str, description: str = ""):
+        pass
+
+    def end(self):
+        pass
+
+
+INVALID_SPAN = _NonRecordingSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=INVALID_SPAN)
+
+
+class ConsoleSpanExporter:
+    def export(self, span: Span):
+        sys.stdout.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+class FileSpanExporter:
+    """JSON Lines; файл открыт на всё время работы, запись под блокировкой (спаны пишут и потоки)."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+
+class Tracer:
+    def __init__(self, name: str, exporter):
+        self.name = name
+        self._exporter = exporter
+
+    def start_span(self, name: str, attributes: Optional[dict] = None, trace_id: Optional[str] = None):
+        if self._exporter is None:
+            return INVALID_SPAN
+        parent = _current_span.get()
+        parent_id = parent.span_id if parent.is_recording() and not trace_id else None
+        trace_id = trace_id or (parent.trace_id if parent_id else secrets.token_hex(16))
+        span = Span(name, trace_id, parent_id, attributes, self._exporter)
+        span.set_attribute("otel.scope.name", self.name)
+        return span
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[dict] = None, trace_id: Optional[str] = None):
+        """
+        Спан на время блока; вложенные спаны (в том числе в задачах asyncio, созданных внутри)
+        становятся дочерними. trace_id начинает новую трассу — например, trace_id_for(uid).
+        Исключение записывается в спан и пробрасывается дальше.
+        """
+        span = self.start_span(name, attributes, trace_id)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+def _build_exporter(config: TracingConfig):
+    if config.exporter == "console":
+        return ConsoleSpanExporter()
+    if config.exporter == "file":
+        logger.info(f"🧵 Трассировка включена: {config.file}")
+        return FileSpanExporter(config.file)
+    if config.exporter not in ("", "none"):
+        logger.warning(f"⚠️ Неизвестный TRACING_EXPORTER={config.exporter} — трассировка выключена")
+    return None
+
+
+_exporter = _build_exporter(load_config().tracing)
+
+
+def get_tracer(name: str) -> Tracer:
+    return Tracer(name, _exporter)
+
+
+def get_current_span():
+    return _current_span.get()
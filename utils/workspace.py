@@ -0,0 +1,201 @@
+# bot/utils/workspace.py
+"""
+Рабочие области для скачивания и распаковки отчётов.
+
+Каждая задача получает собственную директорию с уникальным именем, поэтому параллельные
+скачивания не перезаписывают и не удаляют чужие файлы. Небольшие документы вообще не
+пишутся на диск и живут в памяти; крупные — в директории задачи с учётом общей квоты.
+Директории, оставшиеся после падения процесса, удаляет cleanup_orphans().
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from aiogram.types import BufferedInputFile, FSInputFile
+from loguru import logger
+
+from utils.cleaner import remove_temp_files
+
+MB = 1024 * 1024
+
+WORKSPACE_ROOT = Path(os.getenv("WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "finbot_jobs")))
+SPOOL_MAX_BYTES = int(os.getenv("WORKSPACE_SPOOL_MAX_MB", "8")) * MB
+DISK_QUOTA_BYTES = int(os.getenv("WORKSPACE_DISK_QUOTA_MB", "2048")) * MB
+ORPHAN_MAX_AGE_SECONDS = int(os.getenv("WORKSPACE_ORPHAN_MAX_AGE_HOURS", "6")) * 3600
+
+
+class WorkspaceQuotaError(OSError):
+    pass
+
+
+_usage_lock = threading.Lock()
+_disk_usage = 0
+
+
+def _reserve(nbytes: int):
+    global _disk_usage
+    with _usage_lock:
+        if _disk_usage + nbytes > DISK_QUOTA_BYTES:
+            raise WorkspaceQuotaError(
+                f"Превышена квота рабочих областей: {(_disk_usage + nbytes) // MB} из {DISK_QUOTA_BYTES // MB} МБ"
+            )
+        _disk_usage += nbytes
+
+
+def _release(nbytes: int):
+    global _disk_usage
+    with _usage_lock:
+        _disk_usage = max(_disk_usage - nbytes, 0)
+
+
+@dataclass
+class ReportFile:
+    """Документ отчёта: либо в памяти (data), либо на диске в рабочей области (path)."""
+    filename: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def open(self):
+        """Поток для чтения без загрузки крупного файла в память целиком."""
+        return io.BytesIO(self.data) if self.data is not None else open(self.path, "rb")
+
+    def as_input_file(self, filename: Optional[str] = None):
+        if self.data is not None:
+            return BufferedInputFile(self.data, filename=filename or self.filename)
+        return FSInputFile(path=self.path, filename=filename or self.filename)
+
+
+class Workspace:
+    """Временная область одной задачи. Использовать как контекстный менеджер."""
+
+    def __init__(self, prefix: str = "job"):
+        self.prefix = prefix
+        self._dir: Optional[Path] = None
+        self._reserved = 0
+
+    @property
+    def directory(self) -> Path:
+        if self._dir is None:
+            WORKSPACE_ROOT.mkdir(parents=True, exist_ok=True)
+            self._dir = Path(tempfile.mkdtemp(prefix=f"{self.prefix}_", dir=WORKSPACE_ROOT))
+        return self._dir
+
+    def reserve(self, nbytes: int):
+        _reserve(nbytes)
+        self._reserved += nbytes
+
+    def add_bytes(self, filename: str, data: bytes) -> ReportFile:
+        if len(data) <= SPOOL_MAX_BYTES:
+            return ReportFile(filename=filename, data=data)
+
+        self.reserve(len(data))
+        path = self.new_path()
+        with open(path, "wb") as f:
+            f.write(data)
+        return ReportFile(filename=filename, path=str(path))
+
+    def spool(self, filename: str) -> "SpoolWriter":
+        return SpoolWriter(self, filename)
+
+    def new_path(self) -> Path:
+        return self.directory / uuid.uuid4().hex
+
+    def cleanup(self):
+        if self._dir is not None:
+            remove_temp_files([str(self._dir)])
+            self._dir = None
+        _release(self._reserved)
+        self._reserved = 0
+
+    def __enter__(self) -> "Workspace":
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+class SpoolWriter:
+    """
+    Приёмник потока (например, члена архива): копит данные в памяти и только при
+    превышении SPOOL_MAX_BYTES переносит их в файл рабочей области. Квота учитывает все
+    записанные байты — и в памяти, и на диске, иначе архив из множества членов чуть меньше
+    SPOOL_MAX_BYTES целиком оседал бы в памяти мимо квоты.
+    """
+
+    def __init__(self, workspace: Workspace, filename: str):
+        self.workspace = workspace
+        self.filename = filename
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._path: Optional[Path] = None
+        self._size = 0
+
+    def _rollover(self):
+        self._path = self.workspace.new_path()
+        self._file = open(self._path, "wb")
+        self._file.write(self._buffer.getvalue())
+        self._buffer = None
+
+    def write(self, chunk: bytes) -> int:
+        self.workspace.reserve(len(chunk))
+        if self._file is None and self._size + len(chunk) > SPOOL_MAX_BYTES:
+            self._rollover()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+        self._size += len(chunk)
+        return len(chunk)
+
+    def size(self) -> int:
+        return self._size
+
+    def finish(self) -> ReportFile:
+        if self._file is None:
+            return ReportFile(filename=self.filename, data=self._buffer.getvalue())
+        self._file.close()
+        return ReportFile(filename=self.filename, path=str(self._path))
+
+
+def cleanup_orphans(max_age_seconds: int = ORPHAN_MAX_AGE_SECONDS) -> int:
+    """Удаляет рабочие области, брошенные упавшими процессами. Возвращает число удалённых."""
+    if not WORKSPACE_ROOT.exists():
+        return 0
+
+    removed = 0
+    deadline = time.time() - max_age_seconds
+    for entry in WORKSPACE_ROOT.iterdir():
+        try:
+            if entry.stat().st_mtime < deadline:
+                if entry.is_dir():
+                    shutil.rmtree(entry)
+                else:
+                    entry.unlink()
+                removed += 1
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось удалить {entry}: {e}")
+
+    if removed:
+        logger.info(f"🧹 Удалено брошенных рабочих областей: {removed}")
+    return removed